@@ -0,0 +1,179 @@
+"""
+End-to-end upload benchmark against a local MockLibgenServer.
+
+For every file size and concurrency level, uploads the same file `--uploads` times
+with `upload_fiction`/`upload_scitech` (one LibgenUploader per worker thread) and
+reports uploads/sec, throughput, p50/p99 latency and the peak RSS of the uploading
+process. Each configuration runs in a fresh process, and the server in another one,
+so RSS figures are not mixed up.
+
+    python benchmarks/upload_benchmark.py --sizes 64K 1M 16M --concurrency 1 4 16
+    python benchmarks/upload_benchmark.py --latency 0.05 --bandwidth 10M --json out.json
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from libgen_uploader import LibgenUploader
+from libgen_uploader.mock_server import LibgenStandIn, MockLibgenServer
+from returns.pipeline import is_successful
+
+UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** (2 if sys.platform == "darwin" else 1)
+
+
+def serve(options: dict, urls: multiprocessing.Queue, stop):
+    # the same file is uploaded over and over
+    stand_in = LibgenStandIn(keep_data=False, reject_duplicates=False)
+    with MockLibgenServer(stand_in, **options) as server:
+        urls.put(server.url)
+        stop.wait()
+
+
+def make_file(directory: str, size: int) -> str:
+    path = os.path.join(directory, f"book_{size}.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        while (remaining := size - f.tell()) > 0:
+            f.write(os.urandom(min(remaining, 1024 * 1024)))
+    return path
+
+
+def run(url: str, path: str, library: str, concurrency: int, uploads: int, results):
+    local = threading.local()
+
+    def upload(_):
+        if not hasattr(local, "uploader"):
+            local.uploader = LibgenUploader(base_url=url, pool_size=1)
+        started = time.perf_counter()
+        result = getattr(local.uploader, f"upload_{library}")(path)
+        return time.perf_counter() - started, is_successful(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        timings = list(executor.map(upload, range(uploads)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [t for t, ok in timings if ok]
+    results.put(
+        {
+            "size": os.path.getsize(path),
+            "concurrency": concurrency,
+            "uploads": uploads,
+            "failures": uploads - len(latencies),
+            "seconds": elapsed,
+            "uploads_per_sec": len(latencies) / elapsed,
+            "mb_per_sec": os.path.getsize(path) * len(latencies) / elapsed / 1024**2,
+            "p50": percentile(latencies, 50) if latencies else None,
+            "p99": percentile(latencies, 99) if latencies else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["64K", "1M", "16M"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--uploads", type=int, default=50, help="per configuration")
+    parser.add_argument("--library", choices=["fiction", "scitech"], default="scitech")
+    parser.add_argument("--latency", type=float, default=0, help="seconds")
+    parser.add_argument("--bandwidth", help="bytes per second, e.g. 10M")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    server_options = {
+        "latency": args.latency,
+        "bandwidth": parse_size(args.bandwidth) if args.bandwidth else None,
+        "error_rate": args.error_rate,
+    }
+    urls, stop = multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(server_options, urls, stop))
+    server.start()
+    url = urls.get(timeout=10)
+
+    print(
+        "{:>10} {:>5} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9}".format(
+            "size", "conc", "failed", "uploads/s", "MiB/s", "p50 s", "p99 s", "RSS MiB"
+        )
+    )
+    all_results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size in map(parse_size, args.sizes):
+                path = make_file(directory, size)
+                for concurrency in args.concurrency:
+                    results = multiprocessing.Queue()
+                    worker = multiprocessing.Process(
+                        target=run,
+                        args=(
+                            url,
+                            path,
+                            args.library,
+                            concurrency,
+                            args.uploads,
+                            results,
+                        ),
+                    )
+                    worker.start()
+                    result = results.get()
+                    worker.join()
+                    all_results.append(result)
+                    print(
+                        "{size:>10} {concurrency:>5} {failures:>8} "
+                        "{uploads_per_sec:>10.2f} {mb_per_sec:>9.2f} "
+                        "{p50:>9.3f} {p99:>9.3f} {peak_rss_mb:>9.1f}".format(
+                            **{
+                                k: v if v is not None else math.nan
+                                for k, v in result.items()
+                            }
+                        )
+                    )
+    finally:
+        stop.set()
+        server.join()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": vars(args), "results": all_results}, f, indent=2)
+
+    # figures from failed uploads are meaningless (unless errors are injected)
+    if args.error_rate == 0 and any(r["failures"] for r in all_results):
+        sys.exit("Some uploads failed.")
+
+
+if __name__ == "__main__":
+    main()
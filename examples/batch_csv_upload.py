@@ -1,6 +1,9 @@
 """
 Shows how to use libgen_uploader as a library to batch-upload files from a .CSV.
 
+Progress is saved to a journal file: if the batch is interrupted, running the same
+command again only uploads the rows that were not saved yet.
+
 Example CSV:
 
 filename,isbn,is_fiction
@@ -8,33 +11,24 @@ test.epub,9788800000000,1
 test2.epub,9788800000001,0
 """
 import argparse
-import csv
 import logging
 
 from libgen_uploader import LibgenUploader
+from libgen_uploader.batch import BatchJournal, BatchRunner, read_csv_manifest
 from returns.pipeline import is_successful
 
 
 def main(args):
-    reader = csv.DictReader(open(args.input_file))
-    uploader = LibgenUploader(metadata_source="amazon_it", show_upload_progress=True)
-
-    for i, row in enumerate(reader):
-        if int(row["is_fiction"]):
-            result = uploader.upload_fiction(
-                row["filename"], metadata_query=row["isbn"]
-            )
-        else:
-            result = uploader.upload_scitech(
-                row["filename"], metadata_query=row["isbn"]
-            )
+    uploader = LibgenUploader(metadata_source="amazon_it")
+    runner = BatchRunner(uploader, BatchJournal(args.journal), max_workers=args.workers)
 
+    for job, result in runner.run(read_csv_manifest(args.input_file)):
         if is_successful(result):
             logging.info(
-                f"{row['filename']} uploaded successfully. Upload URL: {result.unwrap()}"
+                f"{job.file_path} uploaded successfully. Upload URL: {result.unwrap()}"
             )
         else:
-            logging.error(result.failure())
+            logging.error(f"{job.file_path}: {result.failure()}")
 
 
 if __name__ == "__main__":
@@ -42,6 +36,16 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("input_file", type=str)
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Number of concurrent uploads"
+    )
+    parser.add_argument(
+        "-j",
+        "--journal",
+        type=str,
+        default="batch_journal.sqlite3",
+        help="Journal file used to resume interrupted batches",
+    )
 
     args = parser.parse_args()
     main(args)
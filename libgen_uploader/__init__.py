@@ -1 +1,10 @@
-from .libgen_uploader import LibgenMetadata, LibgenUploader
+from .cache import MetadataCache
+from .ledger import UploadLedger
+from .libgen_uploader import (
+    LibgenMetadata,
+    LibgenUploader,
+    PendingUpload,
+    UploadJob,
+    UploadUrl,
+)
+from .metadata_index import MetadataIndex
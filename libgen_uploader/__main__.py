@@ -1,19 +1,31 @@
 import logging
+import os
+import sys
 
-from libgen_uploader import LibgenUploader
+from libgen_uploader import LibgenUploader, UploadJob
+from libgen_uploader.constants import UploadStage
+from libgen_uploader.duplicates import EditPageCheck
+from libgen_uploader.file_index import FileIndex, scan_paths
+from libgen_uploader.helpers import LibgenDuplicateException
+from libgen_uploader.progress import JsonLinesObserver, ProgressDisplay
+from libgen_uploader.throttle import MemoryBudget
 from returns.pipeline import is_successful
 
 
 def main(args):
-    u = LibgenUploader(metadata_source=args.metadata_source, show_upload_progress=True)
+    u = LibgenUploader(
+        metadata_source=args.metadata_source,
+        show_upload_progress=True,
+        duplicate_check=EditPageCheck() if args.check_duplicates else None,
+    )
 
     if args.scitech:
         result = u.upload_scitech(
-            file_path=args.file, metadata_query=args.metadata_query
+            file_path=args.paths[0], metadata_query=args.metadata_query
         )
     else:
         result = u.upload_fiction(
-            file_path=args.file, metadata_query=args.metadata_query
+            file_path=args.paths[0], metadata_query=args.metadata_query
         )
 
     if is_successful(result):
@@ -23,6 +35,96 @@ def main(args):
         raise result.failure()
 
 
+def scan(args) -> int:
+    """Uploads every new or changed file under `args.paths`. Returns the failure count."""
+    paths = scan_paths(args.paths)
+    observers = []
+    if args.progress == "bar":
+        observers.append(ProgressDisplay())
+    elif args.progress == "json":
+        observers.append(JsonLinesObserver(sys.stdout))
+
+    u = LibgenUploader(
+        metadata_source=args.metadata_source,
+        pool_size=args.workers,
+        observers=observers,
+        duplicate_check=EditPageCheck() if args.check_duplicates else None,
+    )
+    index = FileIndex(args.index) if args.index else None
+    library = "scitech" if args.scitech else "fiction"
+
+    if index is not None:
+        pending = index.pending(paths, retry_failed=args.retry_failed)
+    else:
+        pending = ((path, os.stat(path)) for path in paths)
+
+    stats = {}
+
+    def jobs():
+        for path, stat in pending:
+            stats[path] = stat
+            yield UploadJob(path, library=library, job_id=path)
+
+    uploaded = present = failed = 0
+    try:
+        for job, result in u.upload_many(
+            jobs(),
+            max_workers=args.workers,
+            preflight_workers=args.preflight_workers,
+            memory_budget=MemoryBudget(args.memory_budget * 1024**2)
+            if args.memory_budget
+            else None,
+        ):
+            stat = stats.pop(job.job_id)
+            if is_successful(result):
+                uploaded += 1
+                url = result.unwrap()
+                logging.info(f"Uploaded {job.file_path}: {url}")
+                if index is not None:
+                    index.record(
+                        job.job_id,
+                        size=stat.st_size,
+                        mtime_ns=stat.st_mtime_ns,
+                        stage=UploadStage.SAVED,
+                        md5=getattr(url, "digests", {}).get("md5"),
+                        url=url,
+                    )
+            elif isinstance(result.failure(), LibgenDuplicateException):
+                # nothing left to do for this file
+                present += 1
+                logging.info(f"Skipped {job.file_path}: {result.failure()}")
+                if index is not None:
+                    index.record(
+                        job.job_id,
+                        size=stat.st_size,
+                        mtime_ns=stat.st_mtime_ns,
+                        stage=UploadStage.SAVED,
+                        url=result.failure().url,
+                    )
+            else:
+                failed += 1
+                logging.error(f"Failed to upload {job.file_path}: {result.failure()}")
+                if index is not None:
+                    index.record(
+                        job.job_id,
+                        size=stat.st_size,
+                        mtime_ns=stat.st_mtime_ns,
+                        stage=UploadStage.FAILED,
+                        error=repr(result.failure()),
+                    )
+    finally:
+        if index is not None:
+            index.close()
+        for observer in observers:
+            if isinstance(observer, ProgressDisplay):
+                observer.close()
+
+    logging.info(
+        f"Done: {uploaded} uploaded, {present} already in the library, {failed} failed."
+    )
+    return failed
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -69,7 +171,53 @@ if __name__ == "__main__":
     parser.add_argument(
         "-d", "--debug", action="store_true", help="Activate debug logging"
     )
-    parser.add_argument("file", type=str)
+    parser.add_argument(
+        "--check-duplicates",
+        action="store_true",
+        help="Ask the library whether each file is already there before sending it",
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        help="SQLite file index, so that later runs only upload new or changed files",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Concurrent uploads when uploading several files (default: 4)",
+    )
+    parser.add_argument(
+        "--preflight-workers",
+        type=int,
+        default=2,
+        help="Processes checking files ahead of the uploads (default: 2, 0 = inline)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="Start uploads while their estimated memory fits in MB megabytes, smallest files first (up to --workers at once)",
+    )
+    parser.add_argument(
+        "--progress",
+        choices=["bar", "json", "none"],
+        default="bar",
+        help="With several files: one progress bar for all uploads, JSON lines events on stdout, or nothing (default: bar)",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Upload again unchanged files that failed in a previous run (with --index)",
+    )
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="+",
+        metavar="path",
+        help="Book file, directory (scanned recursively) or glob pattern",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.DEBUG if args.debug is True else logging.INFO)
@@ -80,4 +228,20 @@ if __name__ == "__main__":
         else:
             raise parser.error("--metadata-query requires --metadata-source")
 
-    main(args)
+    single = args.paths[0]
+    if (
+        len(args.paths) == 1
+        and not args.index
+        and not os.path.isdir(single)
+        and not any(c in single for c in "*?[")
+    ):
+        # a single file (raises FileNotFoundError if it doesn't exist)
+        main(args)
+    else:
+        if args.metadata_query:
+            raise parser.error("--metadata-query only works with a single file")
+        try:
+            failed = scan(args)
+        except FileNotFoundError as e:
+            raise parser.error(str(e))
+        sys.exit(1 if failed else 0)
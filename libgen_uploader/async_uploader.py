@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from ntpath import basename
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urljoin
+
+try:
+    import httpx
+except ImportError as e:  # pragma: no cover
+    raise ImportError(
+        "AsyncLibgenUploader requires httpx, install it with `pip install httpx`."
+    ) from e
+
+from bs4 import BeautifulSoup
+from returns.pipeline import is_successful
+from returns.result import Failure, Result, Success
+
+from .constants import (
+    LIBGEN_BASE_URL,
+    UPLOAD_USERNAME,
+    UPLOAD_PASSWORD,
+)
+from .helpers import (
+    LibgenMetadataException,
+    LibgenUploadException,
+    are_forms_equal,
+    check_hash_algorithms,
+    check_html_parser,
+    check_metadata_form_response,
+    check_upload_form_response,
+    get_upload_md5,
+    get_upload_url,
+)
+from .libgen_uploader import LibgenMetadata, LibgenUploader, UploadUrl
+from .metadata_index import MetadataIndex
+from .preflight import inspect_file
+from .streams import (
+    HASH_ALGORITHMS,
+    HashingReader,
+    MultipartBody,
+    UploadFile,
+    file_name as get_file_name,
+    open_file,
+    to_reader,
+)
+
+# import after .libgen_uploader, which patches werkzeug for robobrowser
+from robobrowser.forms.form import Form
+from robobrowser.forms.fields import Submit
+
+
+def _unwrap(result: Result):
+    # re-raise the original exception instead of returns' UnwrapFailedError
+    if not is_successful(result):
+        raise result.failure()
+    return result.unwrap()
+
+
+async def _read_in_thread(body: MultipartBody) -> AsyncIterator[bytes]:
+    # file reads and hashing happen in the default executor, off the event loop
+    loop = asyncio.get_running_loop()
+    chunks = iter(body)
+    while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+        yield chunk
+
+
+class _Session:
+    """
+    Cookies of one upload (the upload and form pages are tied to its session), over the
+    uploader's shared client and connection pool.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, auth: httpx.Auth):
+        self.client = client
+        self.auth = auth
+        self.cookies = httpx.Cookies()
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        request = self.client.build_request(method, url, **kwargs)
+        for _ in range(self.client.max_redirects + 1):
+            # the client's own cookie jar is shared by every upload: send this one's
+            request.headers.pop("Cookie", None)
+            self.cookies.set_cookie_header(request)
+            response = await self.client.send(
+                request, auth=self.auth, follow_redirects=False
+            )
+            self.cookies.extract_cookies(response)
+            if response.next_request is None:
+                return response
+            request = response.next_request
+        raise httpx.TooManyRedirects(
+            "Exceeded maximum allowed redirects.", request=request
+        )
+
+
+class _Page:
+    """Parsed response, remembering its URL so forms can be submitted relative to it."""
+
+    def __init__(self, response: httpx.Response, parser: str = "html.parser"):
+        self.url = str(response.url)
+        self.parsed = BeautifulSoup(response.content, parser)
+
+    def get_form(self) -> Form:
+        return Form(self.parsed.find("form"))
+
+
+class AsyncLibgenUploader:
+    """
+    asyncio version of LibgenUploader, built on httpx.
+
+    Each upload has its own session cookies, so a single instance can run many uploads
+    concurrently on the same connection pool (e.g. with `asyncio.gather`). A `client`
+    passed in is left open and keeps its own auth.
+    """
+
+    metadata_source = None
+    hash_algorithms: Tuple[str, ...] = HASH_ALGORITHMS
+    parser: str = "html.parser"
+    base_url: str = LIBGEN_BASE_URL
+    metadata_index: Optional[MetadataIndex] = None
+
+    def __init__(
+        self,
+        *,
+        metadata_source: str = None,
+        client: httpx.AsyncClient = None,
+        timeout: float = 60,
+        hash_algorithms: Iterable[str] = HASH_ALGORITHMS,
+        parser: str = "html.parser",
+        base_url: str = LIBGEN_BASE_URL,
+        metadata_index: MetadataIndex = None,
+    ):
+        if metadata_source:
+            self.metadata_source = metadata_source
+        self.hash_algorithms = check_hash_algorithms(hash_algorithms)
+        self.parser = check_html_parser(parser)
+        self.base_url = base_url
+        self.metadata_index = metadata_index
+
+        self._owns_client = client is None
+        self._client = client or httpx.AsyncClient(timeout=timeout)
+        self._auth = httpx.BasicAuth(UPLOAD_USERNAME, UPLOAD_PASSWORD)
+
+    async def __aenter__(self) -> AsyncLibgenUploader:
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def _get_page(self, session: _Session, url: str) -> _Page:
+        response = await session.request("GET", url)
+        response.raise_for_status()
+        return _Page(response, self.parser)
+
+    async def _submit_form(
+        self, session: _Session, page: _Page, form: Form, submit: Submit = None
+    ) -> _Page:
+        payload = form.serialize(submit=submit).to_requests(form.method.upper())
+        response = await session.request(
+            form.method.upper(),
+            urljoin(page.url, form.action) or page.url,
+            content=urlencode(payload["data"]),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        response.raise_for_status()
+        return _Page(response, self.parser)
+
+    async def _upload_file(
+        self, session: _Session, file: UploadFile, library: str
+    ) -> Tuple[_Page, Dict[str, str]]:
+        upload_url = get_upload_url(library, self.base_url)
+
+        await self._get_page(session, upload_url)
+
+        if isinstance(file, str):
+            file_name, reader = basename(file), open_file(file)
+        else:
+            reader = to_reader(file)
+            file_name = get_file_name(file) or "book.{}".format(
+                inspect_file(reader).extension
+            )
+        reader = HashingReader(reader, self.hash_algorithms)
+
+        # sent from the reader's current position, like LibgenUploader does;
+        # closes the file opened above (files passed by the caller stay open)
+        with MultipartBody("file", file_name, reader) as body:
+            response = await session.request(
+                "POST",
+                upload_url,
+                content=_read_in_thread(body),
+                headers={
+                    "Content-Type": body.content_type,
+                    "Content-Length": str(len(body)),
+                },
+            )
+            response.raise_for_status()
+            digests = reader.hexdigests()
+
+        page = _Page(response, self.parser)
+        server_md5 = get_upload_md5(page.parsed)
+        if server_md5 and server_md5 != digests.get("md5", server_md5):
+            raise LibgenUploadException(
+                f"Upload failed: server MD5 {server_md5} does not match the file's."
+            )
+        return page, digests
+
+    async def _fetch_metadata(
+        self,
+        session: _Session,
+        page: _Page,
+        form: Form,
+        *,
+        metadata_source: str = None,
+        metadata_query: Union[str, List[str]] = None,
+    ) -> Form:
+        if not metadata_source or not metadata_query:
+            return form
+
+        metadata_source = metadata_source.strip().lower()
+        if metadata_source not in (sources := form["metadata_source"].options):
+            raise LibgenUploadException(
+                "Invalid metadata source {}. Valid sources: {}".format(
+                    metadata_source, ", ".join(s for s in sources)
+                )
+            )
+
+        if isinstance(metadata_query, str):
+            metadata_query = [metadata_query]
+
+        if new_form := LibgenUploader._metadata_from_index(
+            self.metadata_index, form, metadata_query
+        ):
+            return new_form
+
+        for i, query in enumerate(metadata_query):
+            form["metadata_source"].value = metadata_source
+            form["metadata_query"].value = query
+            logging.debug(
+                f"Fetching metadata from {metadata_source} with query {query}"
+            )
+            new_form = (
+                await self._submit_form(
+                    session, page, form, submit=form["fetch_metadata"]
+                )
+            ).get_form()
+
+            # check that form data has actually changed
+            if not _unwrap(are_forms_equal(form, new_form)):
+                return new_form
+
+            logging.debug(
+                f"No results found for metadata query {query} ({i + 1}/{len(metadata_query)})"
+            )
+
+        raise LibgenMetadataException("Failed to fetch metadata: no results")
+
+    async def _submit_and_check_form(
+        self, session: _Session, page: _Page, form: Form
+    ) -> str:
+        response = await self._submit_form(session, page, form)
+        try:
+            return _unwrap(check_metadata_form_response(response.parsed))
+        except LibgenUploadException as e:
+            exc_str = str(e).lower()
+            if "unknown" in exc_str or "asin" not in exc_str:
+                raise
+
+            # bad ASIN, remove and resubmit
+            logging.warning(
+                "Fetched metadata contained a bad ASIN. Trying to remove and resubmit..."
+            )
+            form = response.get_form()
+            form["asin"].value = ""
+            return _unwrap(
+                check_metadata_form_response(
+                    (await self._submit_form(session, response, form)).parsed
+                )
+            )
+
+    async def _upload(
+        self,
+        *,
+        file_path: UploadFile,
+        library: str,
+        metadata: Optional[LibgenMetadata],
+        metadata_source: Optional[str],
+        metadata_query: Union[str, List[str], None],
+    ) -> Result[UploadUrl, Exception]:
+        try:
+            if [metadata_query, metadata_source].count(None) == 1:
+                if metadata_source is None and self.metadata_source is not None:
+                    metadata_source = self.metadata_source
+                else:
+                    raise LibgenUploadException(
+                        "Both metadata_source and metadata_query are required to fetch metadata."
+                    )
+
+            # file checks touch the disk, keep them off the event loop
+            file = _unwrap(
+                await asyncio.get_running_loop().run_in_executor(
+                    None, LibgenUploader._validate_file, file_path
+                )
+            )
+            session = _Session(self._client, self._auth)
+            page, digests = await self._upload_file(session, file, library)
+            _unwrap(check_upload_form_response(page.parsed))
+
+            form = await self._fetch_metadata(
+                session,
+                page,
+                page.get_form(),
+                metadata_source=metadata_source,
+                metadata_query=metadata_query,
+            )
+            form = _unwrap(LibgenUploader._update_metadata(form, metadata=metadata))
+            form = _unwrap(LibgenUploader._validate_metadata(form))
+            return Success(
+                UploadUrl(
+                    await self._submit_and_check_form(session, page, form), digests
+                )
+            )
+        except Exception as e:
+            return Failure(e)
+
+    async def upload_fiction(
+        self,
+        file_path: UploadFile,
+        *,
+        metadata: LibgenMetadata = None,
+        metadata_source: str = None,
+        metadata_query: Union[str, List] = None,
+    ) -> Result[UploadUrl, Exception]:
+        return await self._upload(
+            file_path=file_path,
+            library="fiction",
+            metadata=metadata,
+            metadata_source=metadata_source,
+            metadata_query=metadata_query,
+        )
+
+    async def upload_scitech(
+        self,
+        file_path: UploadFile,
+        *,
+        metadata: LibgenMetadata = None,
+        metadata_source: str = None,
+        metadata_query: Union[str, List] = None,
+    ) -> Result[UploadUrl, Exception]:
+        return await self._upload(
+            file_path=file_path,
+            library="scitech",
+            metadata=metadata,
+            metadata_source=metadata_source,
+            metadata_query=metadata_query,
+        )
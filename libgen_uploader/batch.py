@@ -0,0 +1,217 @@
+"""
+Resumable batch uploads.
+
+Every job's progress is written to a SQLite journal as it happens, so a batch that
+is interrupted (crash, kill, network outage) can be restarted with the same journal
+and only the jobs that were not saved yet are uploaded again. Files that were already
+uploaded only have their metadata form completed.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import sqlite3
+import threading
+import time
+
+from functools import partial
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from returns.pipeline import is_successful
+from returns.result import Failure, Result
+
+from .constants import UploadStage
+from .helpers import LibgenDuplicateException
+from .libgen_uploader import LibgenUploader, PendingUpload, UploadJob
+from .throttle import MemoryBudget
+
+
+class JournalEntry(NamedTuple):
+    job_id: str
+    stage: UploadStage
+    url: Optional[str]
+    error: Optional[str]
+    updated_at: float
+    # PendingUpload JSON of uploaded files whose metadata form isn't saved yet
+    pending: Optional[str] = None
+
+
+class BatchJournal:
+    """Crash-safe record of the last stage reached by each job of a batch."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "job_id TEXT PRIMARY KEY, stage TEXT NOT NULL, url TEXT, error TEXT, "
+            "updated_at REAL NOT NULL, pending TEXT)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(journal)")]
+        if "pending" not in columns:  # journal of an older version
+            self._db.execute("ALTER TABLE journal ADD COLUMN pending TEXT")
+
+    def get(self, job_id: str) -> Optional[JournalEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM journal WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return JournalEntry(row[0], UploadStage(row[1]), *row[2:]) if row else None
+
+    def entries(self) -> Iterator[JournalEntry]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM journal ORDER BY rowid").fetchall()
+        return (JournalEntry(r[0], UploadStage(r[1]), *r[2:]) for r in rows)
+
+    def record(
+        self,
+        job_id: str,
+        stage: UploadStage,
+        *,
+        url: str = None,
+        error: str = None,
+        pending: PendingUpload = None,
+    ):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO journal VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(job_id) "
+                "DO UPDATE SET stage = excluded.stage, url = coalesce(excluded.url, url), "
+                "error = excluded.error, updated_at = excluded.updated_at, "
+                "pending = excluded.pending",
+                (
+                    job_id,
+                    stage.value,
+                    url,
+                    error,
+                    time.time(),
+                    pending.to_json() if pending else None,
+                ),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class BatchRunner:
+    """
+    Runs upload jobs through LibgenUploader.upload_many, journaling every stage.
+    Jobs must have a `job_id` that is stable between runs (e.g. the manifest row).
+    """
+
+    def __init__(
+        self,
+        uploader: LibgenUploader,
+        journal: BatchJournal,
+        *,
+        max_workers: int = 4,
+        preflight_workers: int = 0,
+        memory_budget: MemoryBudget = None,
+        metadata_workers: int = 0,
+        retry_failed: bool = True,
+    ):
+        self.uploader = uploader
+        self.journal = journal
+        self.max_workers = max_workers
+        self.preflight_workers = preflight_workers
+        self.memory_budget = memory_budget
+        self.metadata_workers = metadata_workers
+        self.retry_failed = retry_failed
+
+    def _pending(
+        self, jobs: Iterable[UploadJob], uploaded: List[Tuple[UploadJob, PendingUpload]]
+    ) -> Iterator[UploadJob]:
+        done = {UploadStage.SAVED}
+        if not self.retry_failed:
+            done.add(UploadStage.FAILED)
+
+        for job in jobs:
+            if job.job_id is None:
+                raise ValueError(f"Batch jobs need a job_id: {job}")
+
+            if entry := self.journal.get(job.job_id):
+                if entry.stage in done:
+                    logging.debug(f"Skipping job {job.job_id}: {entry.stage.value}")
+                    continue
+                if entry.stage == UploadStage.UPLOADED and entry.pending:
+                    # the server has the file, only its metadata form is left
+                    uploaded.append((job, PendingUpload.from_json(entry.pending)))
+                    continue
+
+            yield job
+
+    def _record(self, job: UploadJob, result: Result[str, Exception]):
+        if is_successful(result):
+            self.journal.record(job.job_id, UploadStage.SAVED, url=result.unwrap())
+        elif isinstance(result.failure(), LibgenDuplicateException):
+            # already in the library: nothing left to do, like the CLI
+            self.journal.record(job.job_id, UploadStage.SAVED, url=result.failure().url)
+        else:
+            self.journal.record(
+                job.job_id, UploadStage.FAILED, error=str(result.failure())
+            )
+
+    def run(
+        self, jobs: Iterable[UploadJob]
+    ) -> Iterator[Tuple[UploadJob, Result[str, Exception]]]:
+        """
+        Uploads all jobs not completed in a previous run, yielding their results.
+        Files uploaded by a previous run only have their metadata form completed.
+        """
+
+        def on_stage(job: UploadJob, stage: UploadStage):
+            # journaled by on_uploaded, with what's needed to complete the upload
+            if stage != UploadStage.UPLOADED:
+                self.journal.record(job.job_id, stage)
+
+        def on_uploaded(job: UploadJob, pending: PendingUpload):
+            self.journal.record(job.job_id, UploadStage.UPLOADED, pending=pending)
+
+        uploaded: List[Tuple[UploadJob, PendingUpload]] = []
+        for job, result in self.uploader.upload_many(
+            self._pending(jobs, uploaded),
+            max_workers=self.max_workers,
+            preflight_workers=self.preflight_workers,
+            memory_budget=self.memory_budget,
+            metadata_workers=self.metadata_workers,
+            on_stage=on_stage,
+            on_uploaded=on_uploaded,
+        ):
+            self._record(job, result)
+            yield job, result
+
+        for job, pending in uploaded:
+            logging.debug(f"Completing the upload of job {job.job_id}")
+            try:
+                result = self.uploader.complete_upload(
+                    pending, on_stage=partial(on_stage, job)
+                )
+            except Exception as e:
+                result = Failure(e)
+            self._record(job, result)
+            yield job, result
+
+
+def read_csv_manifest(path: str) -> Iterator[UploadJob]:
+    """
+    Reads upload jobs from a CSV file with a `filename` column and optional `library`
+    (or `is_fiction`), `metadata_source` and `isbn` (or `metadata_query`) columns.
+    The row number is used as the job_id.
+    """
+    with open(path, newline="") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if "library" in row:
+                library = row["library"]
+            else:
+                library = "fiction" if int(row.get("is_fiction") or 0) else "scitech"
+
+            yield UploadJob(
+                row["filename"],
+                library=library,
+                metadata_source=row.get("metadata_source") or None,
+                metadata_query=row.get("metadata_query") or row.get("isbn") or None,
+                job_id=str(i),
+            )
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# (library, metadata_source, metadata_query)
+CacheKey = Tuple[str, str, str]
+
+
+class MetadataCache:
+    """
+    Cache of metadata form values fetched from external sources.
+
+    Entries are kept in an in-memory LRU and, if `path` is given, in a SQLite file
+    shared between runs. Lookups that returned no results are cached as an empty dict
+    (for `negative_ttl` seconds, defaulting to `ttl`).
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 1024,
+        ttl: float = None,
+        negative_ttl: float = None,
+        path: str = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self._entries: OrderedDict[
+            CacheKey, Tuple[Dict[str, str], float]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(
+                path, check_same_thread=False, isolation_level=None
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "library TEXT, source TEXT, query TEXT, fields TEXT NOT NULL, "
+                "expires_at REAL, PRIMARY KEY (library, source, query))"
+            )
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, str]]:
+        """Returns the cached form values (empty if there were no results) or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                fields, expires_at = self._entries[key]
+            elif self._db is not None and (
+                row := self._db.execute(
+                    "SELECT fields, expires_at FROM metadata "
+                    "WHERE library = ? AND source = ? AND query = ?",
+                    key,
+                ).fetchone()
+            ):
+                fields, expires_at = json.loads(row[0]), row[1]
+                self._store(key, fields, expires_at)
+            else:
+                return None
+
+            if expires_at is not None and expires_at <= time.time():
+                self._delete(key)
+                return None
+
+        return fields
+
+    def set(self, key: CacheKey, fields: Optional[Dict[str, str]]):
+        fields = fields or {}
+        ttl = self.ttl if fields else self.negative_ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._store(key, fields, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                    (*key, json.dumps(fields), expires_at),
+                )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM metadata")
+
+    def _store(self, key: CacheKey, fields: Dict[str, str], expires_at: float):
+        self._entries[key] = (fields, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _delete(self, key: CacheKey):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM metadata WHERE library = ? AND source = ? AND query = ?",
+                key,
+            )
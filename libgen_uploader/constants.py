@@ -1,7 +1,12 @@
+from enum import Enum
+
 LIBGEN_UPLOADER_VERSION = "0.2.0"
 
-FICTION_UPLOAD_URL = "https://library.bz/fiction/upload/"
-SCITECH_UPLOAD_URL = "https://library.bz/main/upload/"
+LIBGEN_BASE_URL = "https://library.bz"
+LIBRARY_PATHS = {"fiction": "fiction", "scitech": "main"}
+
+FICTION_UPLOAD_URL = f"{LIBGEN_BASE_URL}/fiction/upload/"
+SCITECH_UPLOAD_URL = f"{LIBGEN_BASE_URL}/main/upload/"
 
 UPLOAD_USERNAME = "genesis"
 UPLOAD_PASSWORD = "upload"
@@ -20,3 +25,33 @@ METADATA_FORM_SCHEMA = {
     "description": {"type": "string"},
     "comment": {"type": "string"},
 }
+
+# upload form fields filled by "fetch bibliographic data"
+METADATA_FORM_FIELDS = (
+    "title",
+    "authors",
+    "language",
+    "language_options",
+    "edition",
+    "series",
+    "pages",
+    "year",
+    "publisher",
+    "isbn",
+    "gb_id",
+    "asin",
+    "cover",
+    "description",
+)
+
+# how to query multiple metadata sources/queries:
+# one after another, racing for the first result, or racing for the most complete one
+METADATA_STRATEGIES = ("sequential", "first", "most_complete")
+
+
+class UploadStage(str, Enum):
+    VALIDATED = "validated"
+    # file accepted by the server, metadata form received
+    UPLOADED = "uploaded"
+    SAVED = "saved"
+    FAILED = "failed"
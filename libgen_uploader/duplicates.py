@@ -0,0 +1,66 @@
+"""
+Server-side duplicate checks.
+
+Before a file is sent, LibgenUploader can ask a `DuplicateCheck` whether its MD5 is
+already in the target library, and skip the upload (and the whole transfer) if so,
+instead of finding out from the upload form error once the file has been sent.
+"""
+from __future__ import annotations
+
+import logging
+
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import requests
+
+from bs4 import BeautifulSoup
+
+from .constants import LIBRARY_PATHS
+from .helpers import get_upload_md5
+
+
+class DuplicateCheck(ABC):
+    """Looks up file MD5s in a library. Subclass for other lookups (e.g. a mirror's API)."""
+
+    @abstractmethod
+    def find(
+        self, session: requests.Session, md5: str, library: str, base_url: str
+    ) -> Optional[str]:
+        """URL of the file with this MD5 in `library`, None if it isn't there."""
+
+
+class EditPageCheck(DuplicateCheck):
+    """
+    Asks the upload site for the edit page of the file (`/<library>/uploads/edit/<MD5>`,
+    the link given when a file is saved), which only exists for files it already has.
+    The page is expected to list the file's checksums like the upload form page does;
+    a page that doesn't (e.g. a redirect to a login or error page) is logged and
+    treated as not found, so the file is uploaded anyway.
+    """
+
+    def __init__(self, *, timeout: float = 10):
+        self.timeout = timeout
+
+    def find(
+        self, session: requests.Session, md5: str, library: str, base_url: str
+    ) -> Optional[str]:
+        url = "{}/{}/uploads/edit/{}".format(
+            base_url.rstrip("/"), LIBRARY_PATHS[library], md5.upper()
+        )
+        response = session.get(url, timeout=self.timeout, allow_redirects=False)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+
+        listed = None
+        if response.status_code == 200:
+            listed = get_upload_md5(BeautifulSoup(response.content, "html.parser"))
+        if listed == md5.lower():
+            return url
+
+        logging.warning(
+            f"Unexpected edit page for {md5} (HTTP {response.status_code}, "
+            f"listed MD5: {listed}), assuming the file isn't in the library."
+        )
+        return None
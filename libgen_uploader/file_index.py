@@ -0,0 +1,231 @@
+"""
+Incremental scanning of upload folders.
+
+`scan_paths` expands files, directories (recursively) and glob patterns, and
+`FileIndex` remembers the size, mtime and MD5 of every file already handled, so later
+runs only upload new or changed files without reading the unchanged ones again.
+"""
+from __future__ import annotations
+
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .constants import UploadStage
+from .helpers import calculate_md5
+
+BOOK_EXTENSIONS = (
+    ".azw",
+    ".azw3",
+    ".cbr",
+    ".cbz",
+    ".djvu",
+    ".doc",
+    ".docx",
+    ".epub",
+    ".fb2",
+    ".kfx",
+    ".lit",
+    ".mobi",
+    ".pdf",
+    ".rtf",
+)
+
+
+class IndexEntry(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    md5: Optional[str]
+    stage: UploadStage
+    url: Optional[str]
+    error: Optional[str]
+    updated_at: float
+
+
+def _walk(directory: str) -> Iterator[os.DirEntry]:
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path)
+            elif entry.is_file():
+                yield entry
+
+
+def scan_paths(
+    patterns: Iterable[str], *, extensions: Iterable[str] = BOOK_EXTENSIONS
+) -> Iterator[str]:
+    """
+    Yields the absolute paths of the files matching `patterns` (files, directories
+    walked recursively, or globs such as `drop/**/*.pdf`), once each. Files found in
+    directories are filtered by extension; files given explicitly are always kept.
+
+    Raises FileNotFoundError right away if a pattern is neither a directory nor
+    matches any file (e.g. a mistyped path).
+    """
+    patterns = list(patterns)
+    missing = [
+        p
+        for p in patterns
+        if not os.path.isdir(p)
+        and not any(os.path.isfile(m) for m in glob.iglob(p, recursive=True))
+    ]
+    if missing:
+        raise FileNotFoundError(f"No files found for: {', '.join(missing)}")
+    return _scan_paths(patterns, tuple(e.lower() for e in extensions))
+
+
+def _scan_paths(patterns: List[str], extensions: Tuple[str, ...]) -> Iterator[str]:
+    seen = set()
+
+    for pattern in patterns:
+        if os.path.isdir(pattern) or os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = glob.iglob(pattern, recursive=True)  # type: ignore
+
+        for match in matches:
+            if os.path.isdir(match):
+                paths = (
+                    e.path for e in _walk(match) if e.name.lower().endswith(extensions)
+                )
+            elif os.path.isfile(match):
+                paths = iter([match])
+            else:
+                continue
+
+            for path in paths:
+                if (path := os.path.abspath(path)) not in seen:
+                    seen.add(path)
+                    yield path
+
+
+class FileIndex:
+    """SQLite record of the files already uploaded (or rejected), by path."""
+
+    def __init__(self, path: str = "libgen_index.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "md5 TEXT, stage TEXT NOT NULL, url TEXT, error TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def entries(self) -> Dict[str, IndexEntry]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM files").fetchall()
+        return {
+            r[0]: IndexEntry(*r[:4], UploadStage(r[4]), *r[5:])  # type: ignore
+            for r in rows
+        }
+
+    def record(
+        self,
+        path: str,
+        *,
+        size: int,
+        mtime_ns: int,
+        stage: UploadStage,
+        md5: str = None,
+        url: str = None,
+        error: str = None,
+    ):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, md5, stage.value, url, error, time.time()),
+            )
+
+    def pending(
+        self,
+        paths: Iterable[str],
+        *,
+        retry_failed: bool = False,
+        hash_workers: int = 4,
+    ) -> Iterator[Tuple[str, os.stat_result]]:
+        """
+        Yields the paths (with their stat) that are new, changed since they were
+        indexed, or (with `retry_failed`) failed last time. Only files whose mtime
+        changed but size didn't are read, to tell touched files from modified ones:
+        they are hashed by `hash_workers` threads while the other files are yielded.
+        """
+        # one query instead of one per file, for folders with many files
+        entries = self.entries()
+        checking: Set[Future] = set()
+
+        def checked(block: bool) -> Iterator[Tuple[str, os.stat_result]]:
+            if block:
+                wait(checking, return_when=FIRST_COMPLETED)
+            for future in [f for f in checking if f.done()]:
+                checking.remove(future)
+                if (changed := future.result()) is not None:
+                    yield changed
+
+        with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+            try:
+                for path in paths:
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+
+                    entry = entries.get(path)
+                    if entry is None:
+                        yield path, stat
+                    elif (entry.size, entry.mtime_ns) == (
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                    ):
+                        if entry.stage == UploadStage.FAILED and retry_failed:
+                            yield path, stat
+                    elif (
+                        entry.stage == UploadStage.SAVED
+                        and entry.md5
+                        and entry.size == stat.st_size
+                    ):
+                        checking.add(pool.submit(self._touched, path, stat, entry))
+                    else:
+                        yield path, stat
+
+                    # only a bounded number of files waits for its hash
+                    yield from checked(block=len(checking) >= hash_workers * 2)
+
+                while checking:
+                    yield from checked(block=True)
+            finally:
+                # consumer stopped early: don't hash the queued files
+                for future in checking:
+                    future.cancel()
+
+    def _touched(
+        self, path: str, stat: os.stat_result, entry: IndexEntry
+    ) -> Optional[Tuple[str, os.stat_result]]:
+        try:
+            if calculate_md5(path) != entry.md5:
+                return path, stat
+        except OSError:
+            # let the upload report it
+            return path, stat
+
+        # touched, not modified
+        self.record(
+            path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            stage=entry.stage,
+            md5=entry.md5,
+            url=entry.url,
+        )
+        return None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,6 +1,21 @@
 from __future__ import annotations
 
-from typing import List, Union
+import hashlib
+import re
+import threading
+
+from functools import lru_cache
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from bs4 import BeautifulSoup
 from returns.result import safe
@@ -13,22 +28,78 @@ class LibgenUploadException(Exception):
         self.message = message
 
 
+class LibgenDuplicateException(LibgenUploadException):
+    """The file is already in the library, at `url`."""
+
+    def __init__(self, message: str, url: str = None):
+        super().__init__(message)
+        self.url = url
+
+    def __str__(self):
+        return self.message
+
+
 class LibgenMetadataException(Exception):
     def __init__(self, message: str):
         self.message = message
 
 
-def calculate_md5(file_path: str):
+def calculate_md5(file) -> str:
     import hashlib
 
-    with open(file_path, "rb") as f:
-        f_hash = hashlib.md5()
-        while chunk := f.read(8192):
+    from .streams import BUFFER_TYPES
+
+    f_hash = hashlib.md5()
+    if isinstance(file, BUFFER_TYPES):
+        f_hash.update(file)
+        return f_hash.hexdigest()
+
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                f_hash.update(chunk)
+    else:
+        position = file.tell()
+        while chunk := file.read(1024 * 1024):
             f_hash.update(chunk)
+        file.seek(position)
 
     return f_hash.hexdigest()
 
 
+# searched in the parsed text nodes, instead of serializing the whole page again
+_UPLOAD_SUCCESS_RE = re.compile("fetch bibliographic", re.IGNORECASE)
+_SAVE_SUCCESS_RE = re.compile("successfully saved", re.IGNORECASE)
+
+
+def get_upload_url(library: str, base_url: str) -> str:
+    from .constants import LIBRARY_PATHS
+
+    if library not in LIBRARY_PATHS:
+        raise ValueError(f"Unknown library to upload to: {library}")
+    return "{}/{}/upload/".format(base_url.rstrip("/"), LIBRARY_PATHS[library])
+
+
+def check_html_parser(parser: str) -> str:
+    from bs4.builder import builder_registry
+
+    if builder_registry.lookup(parser) is None:
+        raise ValueError(
+            f"HTML parser {parser} is not available, install it (e.g. `pip install lxml`)."
+        )
+    return parser
+
+
+def check_hash_algorithms(algorithms: Iterable[str]) -> Tuple[str, ...]:
+    algorithms = tuple(algorithms)
+    for name in algorithms:
+        try:
+            hashlib.new(name)
+        except (TypeError, ValueError):
+            raise ValueError(f"Hash algorithm {name} is not available.") from None
+    return algorithms
+
+
 @safe
 def check_upload_form_response(response: BeautifulSoup) -> bool:
     if error_el := response.select_one(".form_error"):
@@ -37,12 +108,20 @@ def check_upload_form_response(response: BeautifulSoup) -> bool:
             raise LibgenUploadException(f"Upload failed: {error_text}")
 
     # TODO find better way to detect successful file upload
-    if "fetch bibliographic" in str(response).lower():
+    if response.find(string=_UPLOAD_SUCCESS_RE):
         return True
 
     raise LibgenUploadException("Upload failed: unknown error")
 
 
+def get_upload_md5(response: BeautifulSoup) -> Optional[str]:
+    """MD5 of the uploaded file, as listed by the server on the metadata form page."""
+    for item in response.select("ul.checksums li"):
+        if (name := item.find("i")) and name.text.strip().lower() == "md5":
+            return item.find("pre").text.strip().lower()
+    return None
+
+
 @safe
 def check_metadata_form_response(
     response: BeautifulSoup,
@@ -51,7 +130,7 @@ def check_metadata_form_response(
         error_text = error_el.text.strip()
         raise LibgenUploadException(f"File save failed: {error_text}")
 
-    if "successfully saved" in str(response).lower():
+    if response.find(string=_SAVE_SUCCESS_RE):
         return (
             response.find(lambda el: el.name == "div" and "to share" in el.text)
             .select_one("a")
@@ -75,25 +154,59 @@ def are_forms_equal(first: Form, second: Form) -> bool:
     return True
 
 
-def epub_has_drm(book: Union[str, bytes]) -> bool:
-    from io import BytesIO
-    from zipfile import BadZipFile, ZipFile
+def epub_has_drm(book: Union[str, bytes, BinaryIO]) -> bool:
+    from .preflight import inspect_file
 
-    book_file = BytesIO(book) if isinstance(book, bytes) else book
+    info = inspect_file(book)
+    return info.extension == "epub" and info.drm
 
-    try:
-        z = ZipFile(book_file)  # type: ignore
-        return any("encryption.xml" in f.filename for f in z.filelist)
-    except BadZipFile:
-        # assuming not .epub
-        return False
 
+_validators = threading.local()
 
-def validate_metadata(metadata) -> Union[bool, dict]:
-    from cerberus import Validator
+
+def _compile_rule(rule: dict) -> Optional[Callable[[Any], bool]]:
+    # predicate for the subset of Cerberus rules used by METADATA_FORM_SCHEMA,
+    # None if the rule needs Cerberus
+    rule = dict(rule)
+    kind = rule.pop("type", None)
+    if kind in ("string", "integer"):
+        cls = str if kind == "string" else int
+        minimum = rule.pop("min", None)
+        if rule:
+            return None
+        if minimum is None:
+            return lambda v: isinstance(v, cls)
+        return lambda v: isinstance(v, cls) and v >= minimum
+
+    if kind == "list" and set(rule) <= {"schema"}:
+        item = _compile_rule(rule["schema"]) if "schema" in rule else bool
+        if item is None:
+            return None
+        return lambda v: isinstance(v, list) and all(item(i) for i in v)
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def _metadata_checks() -> Dict[str, Callable[[Any], bool]]:
     from .constants import METADATA_FORM_SCHEMA
 
-    v = Validator(METADATA_FORM_SCHEMA)
+    checks = {k: _compile_rule(rule) for k, rule in METADATA_FORM_SCHEMA.items()}
+    return {k: check for k, check in checks.items() if check is not None}
+
+
+def validate_metadata(metadata) -> Union[bool, dict]:
+    checks = _metadata_checks()
+    if all((check := checks.get(k)) and check(v) for k, v in metadata.items()):
+        return True
+
+    # Cerberus is slow, only use it for rules the checks above don't cover and
+    # to report errors. Validators aren't thread-safe, so keep one per thread.
+    if (v := getattr(_validators, "validator", None)) is None:
+        from cerberus import Validator
+        from .constants import METADATA_FORM_SCHEMA
+
+        v = _validators.validator = Validator(METADATA_FORM_SCHEMA)
     return True if v.validate(metadata) else v.errors
 
 
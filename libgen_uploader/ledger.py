@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+
+from typing import Optional
+
+
+class UploadLedger:
+    """
+    Persistent local record of uploaded files, keyed by content MD5 and library.
+    Safe to share between threads (e.g. upload_many workers).
+    """
+
+    def __init__(self, path: str = "libgen_uploads.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "md5 TEXT NOT NULL, library TEXT NOT NULL, url TEXT NOT NULL, "
+            "uploaded_at REAL NOT NULL, PRIMARY KEY (md5, library))"
+        )
+
+    def get(self, md5: str, library: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url FROM uploads WHERE md5 = ? AND library = ?",
+                (md5.lower(), library),
+            ).fetchone()
+        return row[0] if row else None
+
+    def add(self, md5: str, library: str, url: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)",
+                (md5.lower(), library, url, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,23 +1,53 @@
 from __future__ import annotations
 
+import copy
+import json
 import logging
 import os
+import threading
+import time
 
-from io import BytesIO
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError as FuturesTimeoutError,
+    as_completed,
+    wait,
+)
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from itertools import count
 from ntpath import basename
-from typing import List, Union
-
-import filetype
+from urllib.parse import urljoin
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 # https://github.com/jmcarp/robobrowser/issues/93
 import werkzeug
 
 werkzeug.cached_property = werkzeug.utils.cached_property  # type: ignore
 
+import requests
+
 from bs4 import BeautifulSoup
 from cerberus import schema
-from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+from requests.adapters import HTTPAdapter
 from returns.curry import partial
+from returns.functions import tap
 from returns.result import Failure, Result, Success, safe
 from returns.pointfree import alt, bind, lash, map_
 from returns.pipeline import flow, is_successful
@@ -28,24 +58,69 @@ from tqdm import tqdm
 
 from .constants import (
     LIBGEN_UPLOADER_VERSION,
-    FICTION_UPLOAD_URL,
-    SCITECH_UPLOAD_URL,
+    LIBGEN_BASE_URL,
+    METADATA_FORM_FIELDS,
+    METADATA_STRATEGIES,
     UPLOAD_USERNAME,
     UPLOAD_PASSWORD,
+    UploadStage,
 )
 from .helpers import (
+    LibgenDuplicateException,
     LibgenMetadataException,
     LibgenUploadException,
     are_forms_equal,
+    calculate_md5,
     check_upload_form_response,
+    check_hash_algorithms,
+    check_html_parser,
     check_metadata_form_response,
-    epub_has_drm,
+    get_upload_md5,
+    get_upload_url,
     match_language_to_form_option,
     validate_metadata,
 )
+from .cache import MetadataCache
+from .ledger import UploadLedger
+from .duplicates import DuplicateCheck
+from .metadata_index import MetadataIndex
+from .metrics import ProgressEvent, StageEvent, UploadObserver
+from .retry import RetryPolicy
+from .throttle import (
+    MemoryBudget,
+    RequestScheduler,
+    ThrottledAdapter,
+    TokenBucket,
+    bandwidth_bucket,
+)
+from .preflight import PreflightReport, inspect_file, preflight, preflight_path
+from .streams import (
+    CHUNK_SIZE,
+    HASH_ALGORITHMS,
+    HashingReader,
+    MultipartBody,
+    UploadFile,
+    file_name as get_file_name,
+    open_file,
+    to_reader,
+)
 
 
 class LibgenMetadata:
+    __slots__ = (
+        "title",
+        "language",
+        "authors",
+        "edition",
+        "series",
+        "pages",
+        "year",
+        "publisher",
+        "ISBNs",
+        "description",
+        "comment",
+    )
+
     def __init__(
         self,
         *,
@@ -61,43 +136,244 @@ class LibgenMetadata:
         description: str = None,
         comment: str = None,
     ):
-        result = validate_metadata(
-            {k: v for k, v in locals().items() if k != "self" and v is not None}
+        values = {k: v for k, v in locals().items() if k != "self" and v is not None}
+        result = validate_metadata(values)
+        if result != True:
+            raise LibgenMetadataException(f"Metadata validation failed: {result}")
+        self._set(values)
+
+    def _set(self, values: Dict[str, Any]):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def validate_many(
+        cls, rows: Iterable[Dict[str, Any]]
+    ) -> List[Result[LibgenMetadata, LibgenMetadataException]]:
+        """
+        Validates and builds the metadata of every row (e.g. of a whole manifest,
+        before uploading it). Failures report the row number and the invalid fields.
+        """
+        results: List[Result[LibgenMetadata, LibgenMetadataException]] = []
+        for i, row in enumerate(rows):
+            values = {k: v for k, v in row.items() if v is not None}
+            result = validate_metadata(values)
+            if result != True:
+                results.append(
+                    Failure(
+                        LibgenMetadataException(
+                            f"Row {i}: metadata validation failed: {result}"
+                        )
+                    )
+                )
+                continue
+
+            metadata = cls.__new__(cls)
+            metadata._set(values)
+            results.append(Success(metadata))
+        return results
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Metadata values that are set."""
+        return {
+            field: value
+            for field in self.__slots__
+            if (value := getattr(self, field)) is not None
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, LibgenMetadata):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __hash__(self) -> int:
+        # consistent with __eq__, so that jobs with metadata stay hashable
+        return hash(
+            tuple(
+                (k, tuple(v) if isinstance(v, list) else v)
+                for k, v in self.to_dict().items()
+            )
         )
-        if result == True:
-            self.title = title
-            self.language = language
-            self.authors = authors
-            self.edition = edition
-            self.series = series
-            self.pages = pages
-            self.year = year
-            self.publisher = publisher
-            self.ISBNs = ISBNs
-            self.description = description
-            self.comment = comment
-        else:
-            logging.error(f"Metadata validation failed: {result}")
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items())
+        return f"LibgenMetadata({values})"
+
+
+@dataclass(frozen=True)
+class UploadJob:
+    file_path: UploadFile
+    library: str = "fiction"
+    metadata: LibgenMetadata = None
+    metadata_source: Union[str, List[str]] = None
+    metadata_query: Union[str, List[str]] = None
+    job_id: Optional[str] = None
+
+
+# ids of uploads that aren't upload_many jobs with a job_id, for progress events
+_upload_ids = count(1)
+
+
+class UploadUrl(str):
+    """URL of a saved upload, with the hex digests of the uploaded file by algorithm."""
+
+    def __new__(cls, url: str, digests: Dict[str, str] = None):
+        self = super().__new__(cls, url)
+        self.digests = digests or {}
+        return self
+
+
+@dataclass(frozen=True)
+class PendingUpload:
+    """
+    An upload whose file was accepted by the server, with everything needed to fill
+    in and save its metadata form later: the form page (with its hidden fields), the
+    session cookies and the metadata to use. Plain data: `to_json` / `from_json`.
+    """
+
+    library: str
+    url: str
+    html: str
+    cookies: List[Dict[str, Any]]
+    digests: Dict[str, str]
+    md5: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+    metadata_source: Union[str, List[str], None] = None
+    metadata_query: Union[str, List[str], None] = None
+    upload_id: str = ""
+    name: str = ""
+    bytes_sent: int = 0
+    started_at: float = 0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> PendingUpload:
+        return cls(**json.loads(data))
 
 
 class LibgenUploader:
     metadata_source = None
     show_upload_progress: bool = False
+    ledger: Optional[UploadLedger] = None
+    duplicate_check: Optional[DuplicateCheck] = None
+    metadata_cache: Optional[MetadataCache] = None
+    metadata_index: Optional[MetadataIndex] = None
+    metadata_strategy: str = "sequential"
+    metadata_deadline: float = 30
+    preload_upload_page: bool = True
+    hash_algorithms: Tuple[str, ...] = HASH_ALGORITHMS
+    parser: str = "html.parser"
+    base_url: str = LIBGEN_BASE_URL
+    observers: Tuple[UploadObserver, ...] = ()
+    progress_interval: float = 0.5
+    retry_policy: Optional[RetryPolicy] = None
+    scheduler: Optional[RequestScheduler] = None
+    bandwidth: Optional[TokenBucket] = None
+    upload_bandwidth: Optional[float] = None
 
     def __init__(
-        self, *, metadata_source: str = None, show_upload_progress: bool = False
+        self,
+        *,
+        metadata_source: Union[str, List[str]] = None,
+        show_upload_progress: bool = False,
+        ledger: UploadLedger = None,
+        duplicate_check: DuplicateCheck = None,
+        metadata_cache: MetadataCache = None,
+        metadata_index: MetadataIndex = None,
+        metadata_strategy: str = "sequential",
+        metadata_deadline: float = 30,
+        pool_size: int = 10,
+        keep_alive: bool = True,
+        timeout: Union[float, Tuple[float, float]] = None,
+        preload_upload_page: bool = True,
+        hash_algorithms: Iterable[str] = HASH_ALGORITHMS,
+        parser: str = "html.parser",
+        base_url: str = LIBGEN_BASE_URL,
+        observers: Iterable[UploadObserver] = (),
+        progress_interval: float = 0.5,
+        retry_policy: RetryPolicy = None,
+        scheduler: RequestScheduler = None,
+        bandwidth: Union[float, TokenBucket] = None,
+        upload_bandwidth: float = None,
     ):
         if metadata_source:
             self.metadata_source = metadata_source
 
+        if metadata_strategy not in METADATA_STRATEGIES:
+            raise ValueError(
+                "Invalid metadata strategy {}. Valid strategies: {}".format(
+                    metadata_strategy, ", ".join(METADATA_STRATEGIES)
+                )
+            )
+
         self.show_upload_progress = show_upload_progress
+        self.ledger = ledger
+        self.duplicate_check = duplicate_check
+        self.metadata_cache = metadata_cache
+        self.metadata_index = metadata_index
+        self.metadata_strategy = metadata_strategy
+        self.metadata_deadline = metadata_deadline
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.preload_upload_page = preload_upload_page
+        self.hash_algorithms = check_hash_algorithms(hash_algorithms)
+        self.parser = check_html_parser(parser)
+        self.base_url = base_url
+        self.observers = tuple(observers)
+        self.progress_interval = progress_interval
+        self.retry_policy = retry_policy
+        self.scheduler = scheduler
+        # shared by every upload of this uploader and of its upload_many workers
+        self.bandwidth = (
+            bandwidth_bucket(bandwidth)
+            if isinstance(bandwidth, (int, float))
+            else bandwidth
+        )
+        if upload_bandwidth is not None and upload_bandwidth <= 0:
+            raise ValueError(
+                f"Upload bandwidth must be positive, got {upload_bandwidth}."
+            )
+        self.upload_bandwidth = upload_bandwidth
+        self._stage_counters = {"bytes_sent": 0, "retries": 0}
+        self._upload_bytes_sent = 0
+        self._upload_digests: Dict[str, str] = {}
+        self._upload_id = self._upload_name = self._upload_library = ""
+        self._init_session()
         self._init_browser()
 
+    def _init_session(self):
+        # long-lived session, so connections (and TLS sessions) are reused across uploads
+        self._session = requests.Session()
+        if self.scheduler is not None:
+            adapter = ThrottledAdapter(
+                self.scheduler, pool_connections=1, pool_maxsize=self.pool_size
+            )
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.auth = (UPLOAD_USERNAME, UPLOAD_PASSWORD)
+        if not self.keep_alive:
+            self._session.headers["Connection"] = "close"
+
     def _init_browser(self):
+        # fresh browser state (history, current form) on top of the pooled session
         self._browser = RoboBrowser(
-            parser="html.parser",
+            session=self._session,
+            parser=self.parser,
+            timeout=self.timeout,
         )
-        self._browser.session.auth = (UPLOAD_USERNAME, UPLOAD_PASSWORD)
+
+    def _clone(self, *, share_session: bool = False) -> LibgenUploader:
+        # same settings, separate browser state and (unless shared) connection pool
+        clone = copy.copy(self)
+        if not share_session:
+            clone._init_session()
+        clone._init_browser()
+        return clone
 
     @safe
     def _submit_form_get_response(
@@ -105,10 +381,34 @@ class LibgenUploader:
         form: Form,
         submit: Submit = None,
     ) -> BeautifulSoup:
-        self._browser.submit_form(form, submit=submit)
-        self._browser.response.raise_for_status()
+        def submit_form():
+            cursor = self._browser._cursor
+            try:
+                self._browser.submit_form(form, submit=submit)
+                self._browser.response.raise_for_status()
+            except Exception:
+                # back to the page the form came from, so it can be submitted again
+                self._browser.back(self._browser._cursor - cursor)
+                raise
+
+        self._retry(submit_form)
         return self._browser.parsed
 
+    def _retry(self, function: Callable, *args, **kwargs):
+        # retries only `function`: a failed stage doesn't restart the whole upload
+        if self.retry_policy is None:
+            return function(*args, **kwargs)
+
+        def count_retry(_):
+            self._stage_counters["retries"] += 1
+
+        return self.retry_policy.call(function, *args, on_retry=count_retry, **kwargs)
+
+    def _get(self, url: str) -> requests.Response:
+        response = self._session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
     def _submit_and_check_form(self, form: Form) -> Result[str, Exception]:
         return flow(
             form, self._submit_form_get_response, bind(check_metadata_form_response)
@@ -116,107 +416,306 @@ class LibgenUploader:
 
     @staticmethod
     @safe
-    def _validate_file(file: Union[str, bytes]) -> Union[str, bytes]:
-        if isinstance(file, bytes):
-            # TODO add file data validation?
-            if epub_has_drm(file):
-                raise LibgenUploadException("Your .epub file seems to have DRM.")
-
-            return file
+    def _validate_file(file: UploadFile) -> UploadFile:
+        if isinstance(file, str) and not os.path.isfile(file):
+            raise FileNotFoundError(f"Upload failed: {file} is not a file.")
 
-        if isinstance(file, str):
-            if not os.path.isfile(file):
-                raise FileNotFoundError(f"Upload failed: {file} is not a file.")
+        preflight(file)
+        return file
 
-            if file.endswith(".epub") and epub_has_drm(file):
-                raise LibgenUploadException("Your .epub file seems to have DRM.")
+    @safe
+    def _upload_file(self, file: UploadFile, library: str) -> BeautifulSoup:
+        upload_url = get_upload_url(library, self.base_url)
+        self._init_browser()
 
-            return file
+        if self.preload_upload_page:
+            self._browser._update_state(self._retry(self._get, upload_url))
 
-    @safe
-    def _upload_file(self, file: Union[str, bytes], library: str) -> BeautifulSoup:
-        if library == "scitech":
-            self._init_browser()
-            upload_url = SCITECH_UPLOAD_URL
-        elif library == "fiction":
-            self._init_browser()
-            upload_url = FICTION_UPLOAD_URL
-        else:
-            raise ValueError(f"Unknown library to upload to: {library}")
+        # closes the file opened here (files passed by the caller stay open), even
+        # if the upload fails before its body is built
+        with ExitStack() as stack:
+            if isinstance(file, str):
+                file_name = basename(file)
+                reader = stack.enter_context(open_file(file))
+            else:
+                # stream buffers and file objects as they are, without copying them
+                reader = stack.enter_context(to_reader(file))
+                file_name = get_file_name(file) or "book.{}".format(
+                    inspect_file(reader).extension
+                )
 
-        self._browser.open(upload_url)
+            if self.hash_algorithms:
+                # hash the chunks as they are sent instead of reading the file twice
+                reader = stack.enter_context(
+                    HashingReader(reader, self.hash_algorithms)
+                )
 
-        if isinstance(file, str):
-            encoder = MultipartEncoder(
-                fields={"file": (basename(file), open(file, "rb"))}
-            )
-        elif isinstance(file, bytes):
-            file_ext = filetype.guess_extension(file)
-            encoder = MultipartEncoder(
-                fields={"file": (f"book.{file_ext}", BytesIO(file))}
+            buckets = [self.bandwidth] if self.bandwidth is not None else []
+            if self.upload_bandwidth is not None:
+                buckets.append(bandwidth_bucket(self.upload_bandwidth))
+            # smaller chunks when shaping, so that the pace stays smooth
+            chunk_size = min(
+                [CHUNK_SIZE] + [max(16 * 1024, int(b.rate / 10)) for b in buckets]
             )
 
-        with tqdm(
-            desc=basename(file) if isinstance(file, str) else str(file),
-            total=encoder.len,
-            disable=self.show_upload_progress is False,
-            dynamic_ncols=True,
-            unit="B",
-            unit_scale=True,
-            unit_divisor=1024,
-        ) as bar:
-            monitor = MultipartEncoderMonitor(
-                encoder, lambda monitor: bar.update(monitor.bytes_read - bar.n)
+            body = stack.enter_context(
+                MultipartBody("file", file_name, reader, chunk_size=chunk_size)
             )
-            session = self._browser.session
-            response = session.post(
-                upload_url,
-                data=monitor,
-                headers={"Content-Type": monitor.content_type},
+            with tqdm(
+                desc=file_name,
+                total=len(body),
+                disable=self.show_upload_progress is False,
+                dynamic_ncols=True,
+                unit="B",
+                unit_scale=True,
+                unit_divisor=1024,
+            ) as bar:
+                paid = 0
+                reported = time.monotonic()
+
+                def on_read(body: MultipartBody):
+                    nonlocal paid, reported
+                    sent, paid = body.bytes_read - paid, body.bytes_read
+                    bar.update(sent)
+                    # pace the body: each chunk is sent once its bytes are paid for
+                    for bucket in buckets:
+                        bucket.acquire(sent)
+                    # throttled, observers don't need every chunk
+                    now = time.monotonic()
+                    if now - reported >= self.progress_interval or paid == len(body):
+                        reported = now
+                        self._progress("bytes", bytes_sent=paid, total_bytes=len(body))
+
+                if buckets or self.observers or self.show_upload_progress:
+                    body.callback = on_read
+                # never retried, the file body is sent only once
+                response = self._session.post(
+                    upload_url,
+                    data=body,
+                    headers={"Content-Type": body.content_type},
+                    timeout=self.timeout,
+                    allow_redirects=False,
+                )
+                # the browser keeps the response: don't let it keep the file too
+                response.request.body = None
+                self._upload_bytes_sent = body.bytes_read
+                self._stage_counters["bytes_sent"] = body.bytes_read
+
+                if isinstance(reader, HashingReader):
+                    self._upload_digests = reader.hexdigests()
+
+        if response.is_redirect:
+            # the server accepted the file: only the metadata form page is retried
+            response = self._retry(
+                self._get, urljoin(response.url, response.headers["Location"])
             )
-            response.raise_for_status()
-            self._browser._update_state(response)
+        response.raise_for_status()
+        self._browser._update_state(response)
+
+        # parsed once by the browser, shared with the form checks and get_form()
+        parsed = self._browser.parsed
+        if self._upload_digests:
+            server_md5 = get_upload_md5(parsed)
+            if server_md5 and server_md5 != self._upload_digests.get("md5", server_md5):
+                raise LibgenUploadException(
+                    f"Upload failed: server MD5 {server_md5} does not match the file's."
+                )
 
-        return BeautifulSoup(response.text, "html.parser")
+        return parsed
 
     @safe
     def _fetch_metadata_from_query(
-        self, form, *, metadata_source: str, metadata_query: str
+        self, form, *, metadata_source: str, metadata_query: str, library: str = None
     ) -> Form:
+        cache_key = (library, metadata_source, metadata_query)
+        if self.metadata_cache is not None:
+            if (cached := self.metadata_cache.get(cache_key)) is not None:
+                logging.debug(
+                    f"Using cached metadata from {metadata_source} for query {metadata_query}"
+                )
+                if not cached:
+                    # cached "no results"
+                    return form
+
+                # fresh copy of the form as served, with the cached values filled in
+                new_form = Form(form.parsed)
+                for k, v in cached.items():
+                    new_form[k].value = v
+                return new_form
+
         form["metadata_source"].value = metadata_source
         form["metadata_query"].value = metadata_query
         logging.debug(
             f"Fetching metadata from {metadata_source} with query {metadata_query}"
         )
-        self._submit_form_get_response(form, submit=form["fetch_metadata"])
-        return self._browser.get_form()
+        response = self._submit_form_get_response(form, submit=form["fetch_metadata"])
+        if not is_successful(response):
+            raise response.failure()
+        new_form = self._browser.get_form()
+
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(
+                cache_key,
+                None
+                if are_forms_equal(form, new_form) == Success(True)
+                else {
+                    k: new_form[k].value
+                    for k in METADATA_FORM_FIELDS
+                    if k in new_form.keys()
+                },
+            )
+
+        return new_form
+
+    @staticmethod
+    def _metadata_from_index(
+        index: Optional[MetadataIndex], form: Form, queries: List[str]
+    ) -> Optional[Form]:
+        # fills the form from the first query found in the offline index, if any
+        if index is None:
+            return None
+
+        for query in queries:
+            if (values := index.get(query)) is None:
+                continue
+
+            logging.debug(f"Using indexed metadata for query {query}")
+            # fresh copy of the form as served, like the remote sources return
+            result = LibgenUploader._update_metadata(
+                Form(form.parsed), metadata=LibgenMetadata(**values)
+            )
+            if is_successful(result):
+                return result.unwrap()
+            logging.warning(
+                f"Failed to use indexed metadata for query {query}: {result.failure()}"
+            )
+
+        return None
+
+    def _race_metadata(
+        self,
+        form: Form,
+        candidates: List[Tuple[str, str]],
+        *,
+        library: str = None,
+    ) -> Optional[Form]:
+        """
+        Runs all (source, query) lookups at the same time, each on its own session.
+        Returns the first form with results ("first" strategy) or the one with most
+        metadata fields filled ("most_complete"), considering only lookups completed
+        within `metadata_deadline` seconds.
+        """
+
+        def lookup(source: str, query: str) -> Tuple[Form, Result[Form, Exception]]:
+            uploader = self._clone(share_session=True)
+            uploader._browser._update_state(self._browser.response)
+            # each lookup fills its own copy of the form
+            candidate = Form(form.parsed)
+            return candidate, uploader._fetch_metadata_from_query(
+                candidate,
+                metadata_source=source,
+                metadata_query=query,
+                library=library,
+            )
+
+        def completeness(result: Form) -> int:
+            return sum(
+                1
+                for k in METADATA_FORM_FIELDS
+                if k in result.keys() and result[k].value
+            )
+
+        executor = ThreadPoolExecutor(max_workers=len(candidates))
+        futures = {
+            executor.submit(lookup, source, query): i
+            for i, (source, query) in enumerate(candidates)
+        }
+        found: Dict[int, Form] = {}
+        try:
+            for future in as_completed(futures, timeout=self.metadata_deadline):
+                source, query = candidates[futures[future]]
+                candidate, result = future.result()
+                if not is_successful(result):
+                    logging.debug(
+                        f"Metadata query {query} on {source} failed: {result.failure()}"
+                    )
+                    continue
+
+                new_form = result.unwrap()
+                if are_forms_equal(candidate, new_form) != Success(False):
+                    logging.debug(
+                        f"No results found for metadata query {query} on {source}"
+                    )
+                    continue
+
+                if self.metadata_strategy == "first":
+                    return new_form
+                found[futures[future]] = new_form
+        except FuturesTimeoutError:
+            logging.warning(
+                f"Metadata lookups timed out after {self.metadata_deadline} seconds"
+            )
+        finally:
+            # don't wait for slow lookups
+            executor.shutdown(wait=False)
+            for future in futures:
+                future.cancel()
+
+        if not found:
+            return None
+
+        # most complete, ties broken by candidate order
+        return found[max(sorted(found), key=lambda i: completeness(found[i]))]
 
     @safe
     def _fetch_metadata(
         self,
         form,
         *,
-        metadata_source: str = None,
+        metadata_source: Union[str, List[str]] = None,
         metadata_query: Union[str, List[str]] = None,
         ignore_empty: bool = False,
+        library: str = None,
     ) -> Form:
         if not metadata_source or not metadata_query:
             return form
 
-        metadata_source = metadata_source.strip().lower()
-        if metadata_source not in (sources := form["metadata_source"].options):
-            raise LibgenUploadException(
-                "Invalid metadata source {}. Valid sources: {}".format(
-                    metadata_source, ", ".join(s for s in sources)
+        if isinstance(metadata_source, str):
+            metadata_source = [metadata_source]
+
+        metadata_source = [s.strip().lower() for s in metadata_source]
+        sources = form["metadata_source"].options
+        for source in metadata_source:
+            if source not in sources:
+                raise LibgenUploadException(
+                    "Invalid metadata source {}. Valid sources: {}".format(
+                        source, ", ".join(s for s in sources)
+                    )
                 )
-            )
 
         if isinstance(metadata_query, str):
             metadata_query = [metadata_query]
 
-        for i, query in enumerate(metadata_query):
+        if new_form := self._metadata_from_index(
+            self.metadata_index, form, metadata_query
+        ):
+            return new_form
+
+        candidates = [(s, q) for s in metadata_source for q in metadata_query]
+
+        if self.metadata_strategy != "sequential":
+            if new_form := self._race_metadata(form, candidates, library=library):
+                return new_form
+            if ignore_empty:
+                return form
+            raise LibgenMetadataException("Failed to fetch metadata: no results")
+
+        for i, (source, query) in enumerate(candidates):
             new_form = self._fetch_metadata_from_query(
-                form, metadata_source=metadata_source, metadata_query=query
+                form,
+                metadata_source=source,
+                metadata_query=query,
+                library=library,
             )
 
             if is_successful(new_form):
@@ -230,9 +729,9 @@ class LibgenUploader:
 
             elif result == Success(True):
                 logging.debug(
-                    f"No results found for metadata query {query} ({i + 1}/{len(metadata_query)})"
+                    f"No results found for metadata query {query} on {source} ({i + 1}/{len(candidates)})"
                 )
-                if i == len(metadata_query) - 1:
+                if i == len(candidates) - 1:
                     if ignore_empty:
                         return form
 
@@ -252,9 +751,7 @@ class LibgenUploader:
 
         # replace existing/retrieved metadata with user-provided ones
         if isinstance(metadata, LibgenMetadata):
-            metadata_dict = {
-                k: v for k, v in metadata.__dict__.items() if v is not None
-            }
+            metadata_dict = metadata.to_dict()
             keys_to_copy = (
                 "title",
                 "edition",
@@ -306,7 +803,9 @@ class LibgenUploader:
 
         return form
 
-    def _handle_save_failure(self, exception: Exception) -> Result[str, Exception]:
+    def _handle_save_failure(
+        self, exception: Exception, *, library: str = None
+    ) -> Result[str, Exception]:
         if isinstance(exception, LibgenUploadException) and "unknown" not in (
             exc_str := str(exception).lower()
         ):
@@ -318,12 +817,97 @@ class LibgenUploader:
 
                 form = self._browser.get_form()
                 form["asin"].value = ""
-                return self._submit_and_check_form(form)
+                return self._timed(
+                    "asin_recovery", self._submit_and_check_form, library=library
+                )(form)
 
         # failed to recover, re-raise
         return Failure(exception)
 
-    def _upload(self, library: str, **kwargs) -> Result[str, Exception]:
+    def _emit(self, event: StageEvent):
+        for observer in self.observers:
+            try:
+                observer.stage_finished(event)
+            except Exception:
+                logging.exception(f"Upload observer {observer} failed")
+
+    def _progress(self, kind: str, **fields):
+        if not self.observers:
+            return
+
+        event = ProgressEvent(
+            kind,
+            self._upload_id,
+            self._upload_name,
+            self._upload_library,
+            time.time(),
+            **fields,
+        )
+        for observer in self.observers:
+            try:
+                observer.progress(event)
+            except Exception:
+                logging.exception(f"Upload observer {observer} failed")
+
+    def _timed(self, stage: str, function: Callable, *, library: str) -> Callable:
+        # reports the duration and outcome of a flow step to the observers
+        if not self.observers:
+            return function
+
+        def timed(*args, **kwargs):
+            self._stage_counters = {"bytes_sent": 0, "retries": 0}
+            started = time.perf_counter()
+            error = None
+            try:
+                result = function(*args, **kwargs)
+                if isinstance(result, Result) and not is_successful(result):
+                    error = result.failure()
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._emit(
+                    StageEvent(
+                        stage,
+                        library,
+                        time.perf_counter() - started,
+                        error is None,
+                        type(error).__name__ if error is not None else None,
+                        **self._stage_counters,
+                    )
+                )
+
+        return timed
+
+    def _preflight_result(
+        self, file: UploadFile, report: PreflightReport, library: str
+    ) -> Result[UploadFile, Exception]:
+        error = report.error
+        self._emit(
+            StageEvent(
+                "validate",
+                library,
+                report.duration,
+                error is None,
+                type(error).__name__ if error is not None else None,
+            )
+        )
+        return Success(file) if error is None else Failure(error)
+
+    def _upload(
+        self,
+        library: str,
+        *,
+        on_stage: Callable[[UploadStage], None] = None,
+        preflighted: PreflightReport = None,
+        job_id: str = None,
+        defer_metadata: bool = False,
+        on_uploaded: Callable[[PendingUpload], None] = None,
+        **kwargs,
+    ) -> Result[Union[UploadUrl, PendingUpload], Exception]:
+        self._upload_digests = {}
+
         if [kwargs["metadata_query"], kwargs["metadata_source"]].count(None) == 1:
             if kwargs["metadata_source"] is None and self.metadata_source is not None:
                 kwargs["metadata_source"] = self.metadata_source
@@ -332,40 +916,195 @@ class LibgenUploader:
                     "Both metadata_source and metadata_query are required to fetch metadata."
                 )
 
-        upload_url: Result[str, Exception] = flow(
-            kwargs["file_path"],
-            self._validate_file,
-            bind(partial(self._upload_file, library=library)),
-            bind(check_upload_form_response),
-            map_(lambda *_: self._browser.get_form()),  # type: ignore
+        started = time.perf_counter()
+        self._upload_bytes_sent = 0
+        timed = partial(self._timed, library=library)
+
+        self._upload_id = job_id or str(next(_upload_ids))
+        self._upload_name = get_file_name(kwargs["file_path"]) or "<{}>".format(
+            type(kwargs["file_path"]).__name__
+        )
+        self._upload_library = library
+        self._progress("started")
+
+        def notify(stage: UploadStage):
+            if on_stage:
+                on_stage(stage)
+            if stage not in (UploadStage.SAVED, UploadStage.FAILED):
+                self._progress("stage", stage=stage.value)
+
+        if preflighted is None:
+            file = timed("validate", self._validate_file)(kwargs["file_path"])
+        else:
+            # already checked in a preflight worker by upload_many
+            file = self._preflight_result(kwargs["file_path"], preflighted, library)
+        file = file.map(tap(lambda _: notify(UploadStage.VALIDATED)))
+
+        file_md5 = preflighted.md5 if preflighted is not None else None
+        if self._needs_md5 and is_successful(file):
+            file_md5 = file_md5 or calculate_md5(file.unwrap())
+        if self.ledger is not None and is_successful(file):
+            if previous_url := self.ledger.get(file_md5, library):
+                logging.info(
+                    f"File {file_md5} was already uploaded to {library}, skipping: {previous_url}"
+                )
+                notify(UploadStage.SAVED)
+                self._progress("completed", url=previous_url)
+                self._emit(
+                    StageEvent("total", library, time.perf_counter() - started, True)
+                )
+                return Success(UploadUrl(previous_url, {"md5": file_md5}))
+
+        if self.duplicate_check is not None:
+            file = file.bind(
+                timed(
+                    "check_duplicate",
+                    partial(self._check_duplicate, md5=file_md5, library=library),
+                )
+            )
+
+        uploaded = flow(
+            file,
+            bind(timed("upload", partial(self._upload_file, library=library))),
+            bind(timed("check_upload", check_upload_form_response)),
+            map_(tap(lambda _: notify(UploadStage.UPLOADED))),
+        )
+        if (defer_metadata or on_uploaded) and is_successful(uploaded):
+            pending = PendingUpload(
+                library=library,
+                url=self._browser.url,
+                html=self._browser.response.text,
+                cookies=[
+                    {
+                        "name": c.name,
+                        "value": c.value,
+                        "domain": c.domain,
+                        "path": c.path,
+                    }
+                    for c in self._session.cookies
+                ],
+                digests=self._upload_digests,
+                md5=file_md5,
+                metadata=kwargs["metadata"].to_dict()
+                if isinstance(kwargs["metadata"], LibgenMetadata)
+                else None,
+                metadata_source=kwargs["metadata_source"],
+                metadata_query=kwargs["metadata_query"],
+                upload_id=self._upload_id,
+                name=self._upload_name,
+                bytes_sent=self._upload_bytes_sent,
+                started_at=time.time() - (time.perf_counter() - started),
+            )
+            if on_uploaded:
+                on_uploaded(pending)
+            if defer_metadata:
+                # the metadata form is completed later, by complete_upload
+                return Success(pending)
+
+        upload_url = uploaded.bind(
+            lambda _: self._complete_form(
+                library=library,
+                metadata=kwargs["metadata"],
+                metadata_source=kwargs["metadata_source"],
+                metadata_query=kwargs["metadata_query"],
+            )
+        )
+        return self._finish(
+            upload_url,
+            library=library,
+            file_md5=file_md5,
+            duration=time.perf_counter() - started,
+            notify=notify,
+        )
+
+    def _complete_form(
+        self,
+        *,
+        library: str,
+        metadata: Optional[LibgenMetadata],
+        metadata_source: Union[str, List[str], None],
+        metadata_query: Union[str, List[str], None],
+    ) -> Result[str, Exception]:
+        # fills in and saves the metadata form the browser is on
+        timed = partial(self._timed, library=library)
+        return flow(
+            Success(None),
+            map_(timed("parse_form", lambda *_: self._browser.get_form())),  # type: ignore
             bind(
-                partial(
-                    self._fetch_metadata,
-                    metadata_query=kwargs["metadata_query"],
-                    metadata_source=kwargs["metadata_source"],
+                timed(
+                    "fetch_metadata",
+                    partial(
+                        self._fetch_metadata,
+                        metadata_query=metadata_query,
+                        metadata_source=metadata_source,
+                        library=library,
+                    ),
                 )
             ),
             bind(
-                partial(
-                    self._update_metadata,
-                    metadata=kwargs["metadata"],
+                timed(
+                    "update_metadata",
+                    partial(self._update_metadata, metadata=metadata),
                 )
             ),
-            bind(self._validate_metadata),
-            bind(self._submit_and_check_form),
-            lash(self._handle_save_failure),
+            bind(timed("validate_metadata", self._validate_metadata)),
+            bind(timed("save", self._submit_and_check_form)),
+            lash(partial(self._handle_save_failure, library=library)),
         )
 
+    def _finish(
+        self,
+        upload_url: Result[str, Exception],
+        *,
+        library: str,
+        file_md5: Optional[str],
+        duration: float,
+        notify: Callable[[UploadStage], None],
+    ) -> Result[UploadUrl, Exception]:
+        if is_successful(upload_url):
+            digests = self._upload_digests
+            upload_url = upload_url.map(lambda url: UploadUrl(url, digests))
+            if self.ledger is not None and (file_md5 or digests.get("md5")):
+                self.ledger.add(
+                    file_md5 or digests["md5"], library, upload_url.unwrap()
+                )
+            notify(UploadStage.SAVED)
+            self._progress(
+                "completed",
+                bytes_sent=self._upload_bytes_sent,
+                url=str(upload_url.unwrap()),
+            )
+        else:
+            notify(UploadStage.FAILED)
+            error = upload_url.failure()
+            self._progress(
+                "failed",
+                bytes_sent=self._upload_bytes_sent,
+                error=f"{type(error).__name__}: {error}",
+            )
+
+        self._emit(
+            StageEvent(
+                "total",
+                library,
+                duration,
+                is_successful(upload_url),
+                None
+                if is_successful(upload_url)
+                else type(upload_url.failure()).__name__,
+                bytes_sent=self._upload_bytes_sent,
+            )
+        )
         return upload_url
 
     def upload_fiction(
         self,
-        file_path: Union[str, bytes],
+        file_path: UploadFile,
         *,
         metadata: LibgenMetadata = None,
-        metadata_source: str = None,
+        metadata_source: Union[str, List[str]] = None,
         metadata_query: Union[str, List] = None,
-    ) -> Result[str, Exception]:
+    ) -> Result[UploadUrl, Exception]:
         return self._upload(
             file_path=file_path,
             library="fiction",
@@ -376,12 +1115,12 @@ class LibgenUploader:
 
     def upload_scitech(
         self,
-        file_path: Union[str, bytes],
+        file_path: UploadFile,
         *,
         metadata: LibgenMetadata = None,
-        metadata_source: str = None,
+        metadata_source: Union[str, List[str]] = None,
         metadata_query: Union[str, List] = None,
-    ) -> Result[str, Exception]:
+    ) -> Result[UploadUrl, Exception]:
         return self._upload(
             file_path=file_path,
             library="scitech",
@@ -389,3 +1128,270 @@ class LibgenUploader:
             metadata_source=metadata_source,
             metadata_query=metadata_query,
         )
+
+    def begin_upload(
+        self,
+        file_path: UploadFile,
+        *,
+        library: str = "fiction",
+        metadata: LibgenMetadata = None,
+        metadata_source: Union[str, List[str]] = None,
+        metadata_query: Union[str, List] = None,
+    ) -> Result[Union[PendingUpload, UploadUrl], Exception]:
+        """
+        Uploads the file only. Returns a `PendingUpload` to pass to `complete_upload`
+        (on this or another uploader, possibly in another process), or the URL of the
+        previous upload if the ledger has the file already.
+        """
+        return self._upload(
+            file_path=file_path,
+            library=library,
+            metadata=metadata,
+            metadata_source=metadata_source,
+            metadata_query=metadata_query,
+            defer_metadata=True,
+        )
+
+    def complete_upload(
+        self,
+        pending: PendingUpload,
+        *,
+        on_stage: Callable[[UploadStage], None] = None,
+    ) -> Result[UploadUrl, Exception]:
+        """Fetches metadata for, fills in and saves the form of a `begin_upload` upload."""
+        self._upload_id = pending.upload_id
+        self._upload_name = pending.name
+        self._upload_library = pending.library
+        self._upload_digests = dict(pending.digests)
+        self._upload_bytes_sent = pending.bytes_sent
+
+        self._init_browser()
+        for cookie in pending.cookies:
+            self._session.cookies.set(**cookie)
+        # back on the form page, as it was served
+        response = requests.Response()
+        response.status_code = 200
+        response.url = pending.url
+        response.encoding = "utf-8"
+        response._content = pending.html.encode()
+        self._browser._update_state(response)
+
+        upload_url = self._complete_form(
+            library=pending.library,
+            metadata=LibgenMetadata(**pending.metadata) if pending.metadata else None,
+            metadata_source=pending.metadata_source,
+            metadata_query=pending.metadata_query,
+        )
+        return self._finish(
+            upload_url,
+            library=pending.library,
+            file_md5=pending.md5,
+            duration=time.time() - pending.started_at,
+            notify=on_stage or (lambda stage: None),
+        )
+
+    @property
+    def _needs_md5(self) -> bool:
+        return self.ledger is not None or self.duplicate_check is not None
+
+    def _check_duplicate(
+        self, file: UploadFile, *, md5: str, library: str
+    ) -> Result[UploadFile, Exception]:
+        try:
+            url = self._retry(
+                self.duplicate_check.find, self._session, md5, library, self.base_url
+            )
+        except Exception as e:
+            # the check only saves bandwidth, it never stops an upload
+            logging.warning(f"Duplicate check of {md5} failed, uploading anyway: {e}")
+            return Success(file)
+
+        if url:
+            return Failure(
+                LibgenDuplicateException(
+                    f"File {md5} is already in {library}, not uploading: {url}", url
+                )
+            )
+        return Success(file)
+
+    def _upload_job(
+        self,
+        job: UploadJob,
+        on_stage: Callable[[UploadStage], None] = None,
+        preflighted: PreflightReport = None,
+        defer_metadata: bool = False,
+        on_uploaded: Callable[[PendingUpload], None] = None,
+    ) -> Result[Union[UploadUrl, PendingUpload], Exception]:
+        try:
+            return self._upload(
+                file_path=job.file_path,
+                library=job.library,
+                metadata=job.metadata,
+                metadata_source=job.metadata_source,
+                metadata_query=job.metadata_query,
+                on_stage=on_stage,
+                preflighted=preflighted,
+                job_id=job.job_id,
+                defer_metadata=defer_metadata,
+                on_uploaded=on_uploaded,
+            )
+        except Exception as e:
+            if on_stage:
+                on_stage(UploadStage.FAILED)
+            return Failure(e)
+
+    def upload_many(
+        self,
+        jobs: Iterable[UploadJob],
+        *,
+        max_workers: int = 4,
+        preflight_workers: int = 0,
+        memory_budget: MemoryBudget = None,
+        metadata_workers: int = 0,
+        on_stage: Callable[[UploadJob, UploadStage], None] = None,
+        on_uploaded: Callable[[UploadJob, PendingUpload], None] = None,
+    ) -> Iterator[Tuple[UploadJob, Result[str, Exception]]]:
+        """
+        Uploads jobs concurrently, each worker thread using its own browser session.
+        Yields (job, result) tuples as soon as each upload completes.
+
+        With `preflight_workers`, files given by path are checked (and hashed, if a
+        ledger or duplicate check is set) in a process pool while other files are being
+        uploaded. At most `max_workers * 2` jobs wait for or come out of the preflight stage,
+        so it never runs far ahead of the uploads.
+
+        With a `memory_budget`, uploads are started as long as their estimated memory
+        fits in it (up to `max_workers` at once), smallest files first.
+
+        With `metadata_workers`, the metadata forms are completed (fetch, update, save)
+        on a separate thread pool, so slow metadata sources don't hold upload workers.
+
+        `on_stage(job, stage)` is called from the worker threads as each job progresses.
+        `on_uploaded(job, pending)` is called with the state of each uploaded file before
+        its metadata form is completed (e.g. to save it and `complete_upload` it later).
+        """
+        local = threading.local()
+
+        def worker() -> LibgenUploader:
+            if not hasattr(local, "uploader"):
+                local.uploader = self._clone()
+            return local.uploader
+
+        def run(
+            job: UploadJob, report: Optional[PreflightReport]
+        ) -> Tuple[UploadJob, Result[str, Exception]]:
+            return job, worker()._upload_job(
+                job,
+                partial(on_stage, job) if on_stage else None,
+                report,
+                defer_metadata=bool(metadata_workers),
+                # without metadata workers, the form is completed from the live page
+                on_uploaded=partial(on_uploaded, job) if on_uploaded else None,
+            )
+
+        def complete(
+            job: UploadJob, pending: PendingUpload
+        ) -> Tuple[UploadJob, Result[str, Exception]]:
+            try:
+                return job, worker().complete_upload(
+                    pending, on_stage=partial(on_stage, job) if on_stage else None
+                )
+            except Exception as e:
+                if on_stage:
+                    on_stage(job, UploadStage.FAILED)
+                return job, Failure(e)
+
+        jobs = iter(jobs)
+        queue_size = max_workers * 2
+        with ExitStack() as stack:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+            checker = (
+                stack.enter_context(ProcessPoolExecutor(max_workers=preflight_workers))
+                if preflight_workers
+                else None
+            )
+            completer = (
+                stack.enter_context(ThreadPoolExecutor(max_workers=metadata_workers))
+                if metadata_workers
+                else None
+            )
+            checking: Dict[Future, UploadJob] = {}
+            # uploaded files whose metadata form is being completed
+            completing: Set[Future] = set()
+            # (job, report, memory cost) waiting for an upload worker
+            ready: Deque[Tuple[UploadJob, Optional[PreflightReport], int]] = deque()
+            # running uploads and their memory cost
+            uploading: Dict[Future, int] = {}
+
+            def enqueue(job: UploadJob, report: Optional[PreflightReport]):
+                cost = memory_budget.cost(job.file_path) if memory_budget else 0
+                ready.append((job, report, cost))
+
+            def refill():
+                # only keep a bounded number of jobs queued, so huge batches can be streamed
+                while len(checking) + len(ready) < queue_size:
+                    if (job := next(jobs, None)) is None:
+                        break
+                    if checker is not None and isinstance(job.file_path, str):
+                        future = checker.submit(
+                            preflight_path, job.file_path, md5=self._needs_md5
+                        )
+                        checking[future] = job
+                    else:
+                        enqueue(job, None)
+
+                while ready and len(uploading) < max_workers:
+                    if memory_budget is None:
+                        i = 0
+                    # always keep one upload going, even if the budget is used elsewhere
+                    elif (
+                        i := memory_budget.admit(
+                            [cost for *_, cost in ready], force=not uploading
+                        )
+                    ) is None:
+                        break
+                    job, report, cost = ready[i]
+                    del ready[i]
+                    uploading[executor.submit(run, job, report)] = cost
+
+            try:
+                refill()
+                while checking or uploading or completing:
+                    done, _ = wait(
+                        set(uploading) | set(checking) | completing,
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        if future in completing:
+                            completing.remove(future)
+                            yield future.result()
+                        elif future in uploading:
+                            cost = uploading.pop(future)
+                            if memory_budget is not None:
+                                memory_budget.release(cost)
+                            job, result = future.result()
+                            if completer is not None and isinstance(
+                                result.value_or(None), PendingUpload
+                            ):
+                                completing.add(
+                                    completer.submit(complete, job, result.unwrap())
+                                )
+                            else:
+                                yield job, result
+                        else:
+                            job = checking.pop(future)
+                            try:
+                                report = future.result()
+                            except Exception as e:  # e.g. a crashed worker process
+                                report = PreflightReport(
+                                    job.file_path, None, None, 0, e
+                                )
+                            enqueue(job, report)
+                    refill()
+            finally:
+                # consumer stopped early: don't start queued jobs
+                for future in set(uploading) | set(checking) | completing:
+                    future.cancel()
+                if memory_budget is not None:
+                    for cost in uploading.values():
+                        memory_budget.release(cost)
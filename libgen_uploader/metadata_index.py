@@ -0,0 +1,130 @@
+"""
+Offline metadata lookups.
+
+A `MetadataIndex` maps ISBNs and ASINs to book metadata in a SQLite file, built from
+catalogue dumps with `add_many` or `load_jsonl`. LibgenUploader fills the upload form
+from it and only asks the remote metadata sources about identifiers it doesn't have.
+
+    python -m libgen_uploader.metadata_index index.sqlite3 dump1.jsonl dump2.jsonl
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+
+from itertools import islice
+from typing import Any, Dict, Iterable, Optional
+
+from .constants import METADATA_FORM_SCHEMA
+from .helpers import validate_metadata
+
+_ISBN10_RE = re.compile(r"\d{9}[\dX]")
+
+
+def normalize_identifier(identifier: str) -> str:
+    """Uppercase ISBN/ASIN without separators, ISBN-10s converted to ISBN-13."""
+    identifier = re.sub(r"[\s-]", "", str(identifier)).upper()
+    if _ISBN10_RE.fullmatch(identifier):
+        digits = "978" + identifier[:9]
+        check = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+        identifier = digits + str(-check % 10)
+    return identifier
+
+
+class MetadataIndex:
+    """
+    SQLite ISBN/ASIN -> metadata index. Records are dicts with LibgenMetadata field
+    names (`title`, `authors`, `ISBNs`...) and optionally an `ASINs` list; they are
+    indexed by all of their ISBNs and ASINs.
+    """
+
+    def __init__(self, path: str, *, mmap_size: int = 256 * 1024**2):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # lookups read pages straight from the memory-mapped file
+        self._db.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "identifier TEXT PRIMARY KEY, fields TEXT NOT NULL) WITHOUT ROWID"
+        )
+
+    def get(self, identifier: str) -> Optional[Dict[str, Any]]:
+        """LibgenMetadata values of the book with this ISBN or ASIN, if indexed."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fields FROM metadata WHERE identifier = ?",
+                (normalize_identifier(identifier),),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_many(self, records: Iterable[Dict[str, Any]], *, batch_size=10000) -> int:
+        """
+        Indexes records, replacing previous ones with the same identifiers. Invalid
+        records and records without identifiers are skipped. Returns the count added.
+        """
+        added = 0
+        records = iter(records)
+        while batch := list(islice(records, batch_size)):
+            rows = []
+            for record in batch:
+                fields = {
+                    k: v
+                    for k, v in record.items()
+                    if k in METADATA_FORM_SCHEMA and v not in (None, "", [])
+                }
+                identifiers = {
+                    normalize_identifier(i)
+                    for i in (fields.get("ISBNs") or []) + (record.get("ASINs") or [])
+                }
+                if not identifiers or validate_metadata(fields) != True:
+                    logging.debug(f"Skipping metadata record {record}")
+                    continue
+
+                value = json.dumps(fields, separators=(",", ":"))
+                rows.extend((i, value) for i in identifiers)
+                added += 1
+
+            # one transaction per batch
+            with self._lock:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?)", rows
+                )
+                self._db.execute("COMMIT")
+        return added
+
+    def load_jsonl(self, path: str) -> int:
+        """Indexes a catalogue dump with one JSON record per line."""
+        with open(path, encoding="utf-8") as f:
+            return self.add_many(json.loads(line) for line in f if line.strip())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main(args=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m libgen_uploader.metadata_index",
+        description="Build an offline ISBN/ASIN metadata index from JSON lines dumps",
+    )
+    parser.add_argument("index", help="SQLite index file (created if missing)")
+    parser.add_argument("dumps", nargs="+", help="JSON lines catalogue dumps")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    index = MetadataIndex(args.index)
+    for dump in args.dumps:
+        logging.info(f"Indexed {index.load_jsonl(dump)} records from {dump}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Instrumentation of the upload flow.
+
+LibgenUploader reports every stage it runs (validate, upload, check_upload,
+parse_form, fetch_metadata, update_metadata, validate_metadata, save, asin_recovery)
+and the whole upload (stage "total") to its `observers`, along with throttled
+progress events (see `libgen_uploader.progress`). `Metrics` aggregates them
+into counters and histograms exportable in Prometheus text format, `StatsdObserver`
+pushes them to a StatsD server.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import socket
+import threading
+
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class StageEvent(NamedTuple):
+    stage: str
+    library: str
+    duration: float
+    ok: bool
+    # exception class name, if the stage failed
+    error: Optional[str] = None
+    bytes_sent: int = 0
+    retries: int = 0
+
+
+class ProgressEvent(NamedTuple):
+    # "started", "bytes", "stage", "completed" or "failed"
+    kind: str
+    # job_id of upload_many jobs, a per-process counter otherwise
+    upload_id: str
+    name: str
+    library: str
+    time: float
+    bytes_sent: int = 0
+    total_bytes: Optional[int] = None
+    # UploadStage value, for "stage" events
+    stage: Optional[str] = None
+    url: Optional[str] = None
+    # exception class name and message, for "failed" events
+    error: Optional[str] = None
+
+
+class UploadObserver:
+    """Base class for upload observers. Called from the uploading threads."""
+
+    def stage_finished(self, event: StageEvent):
+        pass
+
+    def progress(self, event: ProgressEvent):
+        pass
+
+
+class Metrics(UploadObserver):
+    """Thread-safe counters and duration histograms of the upload stages."""
+
+    def __init__(
+        self, *, prefix: str = "libgen_uploader", buckets: Sequence[float] = None
+    ):
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._lock = threading.Lock()
+        self.stages: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.failures: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.bytes_sent: Dict[str, int] = defaultdict(int)
+        # stage -> (count per bucket, sum, count)
+        self._durations: Dict[str, Tuple[List[int], float, int]] = {}
+
+    def stage_finished(self, event: StageEvent):
+        with self._lock:
+            self.stages[(event.stage, "ok" if event.ok else "failed")] += 1
+            if event.error:
+                self.failures[(event.stage, event.error)] += 1
+            if event.retries:
+                self.retries[event.stage] += event.retries
+            if event.bytes_sent and event.stage != "total":
+                self.bytes_sent[event.library] += event.bytes_sent
+
+            counts, total, count = self._durations.get(
+                event.stage, ([0] * len(self.buckets), 0.0, 0)
+            )
+            i = bisect.bisect_left(self.buckets, event.duration)
+            if i < len(counts):
+                counts[i] += 1
+            self._durations[event.stage] = (counts, total + event.duration, count + 1)
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples):
+            lines.append(f"# HELP {p}_{name} {description}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{p}_{name}{suffix}{{{label_str}}} {value}")
+
+        with self._lock:
+            histogram = []
+            for stage, (counts, total, count) in sorted(self._durations.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    histogram.append(
+                        ("_bucket", [("stage", stage), ("le", bound)], cumulative)
+                    )
+                histogram.append(("_bucket", [("stage", stage), ("le", "+Inf")], count))
+                histogram.append(("_sum", [("stage", stage)], total))
+                histogram.append(("_count", [("stage", stage)], count))
+
+            metric(
+                "stage_duration_seconds",
+                "histogram",
+                "Duration of upload stages.",
+                histogram,
+            )
+            metric(
+                "stages_total",
+                "counter",
+                "Upload stages run, by outcome.",
+                [
+                    ("", [("stage", s), ("status", status)], n)
+                    for (s, status), n in sorted(self.stages.items())
+                ],
+            )
+            metric(
+                "stage_failures_total",
+                "counter",
+                "Failed upload stages, by exception.",
+                [
+                    ("", [("stage", s), ("reason", reason)], n)
+                    for (s, reason), n in sorted(self.failures.items())
+                ],
+            )
+            metric(
+                "stage_retries_total",
+                "counter",
+                "Retries within upload stages.",
+                [("", [("stage", s)], n) for s, n in sorted(self.retries.items())],
+            )
+            metric(
+                "bytes_sent_total",
+                "counter",
+                "File bytes uploaded.",
+                [
+                    ("", [("library", lib)], n)
+                    for lib, n in sorted(self.bytes_sent.items())
+                ],
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+class StatsdObserver(UploadObserver):
+    """Sends stage timings and counters to a StatsD server over UDP."""
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8125,
+        *,
+        prefix: str = "libgen_uploader",
+    ):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def stage_finished(self, event: StageEvent):
+        name = f"{self.prefix}.{event.stage}"
+        lines = [
+            f"{name}.duration:{event.duration * 1000:.3f}|ms",
+            f"{name}.{'ok' if event.ok else 'failed'}:1|c",
+        ]
+        if event.error:
+            lines.append(f"{name}.failures.{event.error}:1|c")
+        if event.retries:
+            lines.append(f"{name}.retries:{event.retries}|c")
+        if event.bytes_sent and event.stage != "total":
+            lines.append(
+                f"{self.prefix}.{event.library}.bytes_sent:{event.bytes_sent}|c"
+            )
+
+        try:
+            self._socket.sendto("\n".join(lines).encode(), self.address)
+        except OSError as e:
+            logging.debug(f"Failed to send metrics to StatsD: {e}")
+
+    def close(self):
+        self._socket.close()
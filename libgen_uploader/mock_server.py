@@ -0,0 +1,448 @@
+"""
+Local stand-in for the library.bz upload forms.
+
+Serves the same form HTML the uploader parses, so the full upload flow (upload page,
+file POST, fetch metadata, save) can run without network access: in-process through
+a transport adapter (see the tests), or over HTTP with `MockLibgenServer`, which can
+add latency, limit bandwidth and inject errors for benchmarks.
+
+    python -m libgen_uploader.mock_server --port 8080 --latency 0.05
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from email.parser import BytesParser
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+METADATA_SOURCES = [
+    "local",
+    "goodreads",
+    "amazon_us",
+    "amazon_uk",
+    "amazon_de",
+    "amazon_fr",
+    "amazon_it",
+    "amazon_es",
+    "amazon_jp",
+    "worldcat",
+    "loc",
+    "bl",
+    "rsl",
+    "google_books",
+    "douban",
+]
+
+LANGUAGES = ["English", "French", "German", "Italian", "Spanish"]
+
+TEXT_FIELDS = [
+    "title",
+    "authors",
+    "language",
+    "edition",
+    "series",
+    "pages",
+    "year",
+    "publisher",
+    "isbn",
+    "gb_id",
+    "asin",
+    "cover",
+]
+
+FILE_FIELDS = ["file_source", "file_source_issue", "file_commentary"]
+
+LIBRARIES = {"fiction": "fiction", "main": "scitech"}
+SITE_PATHS = {v: k for k, v in LIBRARIES.items()}
+
+UPLOAD_PAGE = """<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN" "http://www.w3.org/TR/html4/strict.dtd">
+<html>
+<head><base href="/{path}/upload/"></head>
+<body>
+<div style="width:800px;margin:0 auto">
+	<form method="post" enctype="multipart/form-data" action="">
+	Choose a file to upload:
+	<input type="file" name="file"> <input type="submit" value="Upload!">
+	</form>
+	{error}
+</div>
+</body>
+</html>
+"""
+
+SAVED_PAGE = """<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN" "http://www.w3.org/TR/html4/strict.dtd">
+<html>
+<body>
+<div>Your file has been successfully saved.</div>
+<div>Please use this link to share the file: <a href="{url}">{url}</a></div>
+</body>
+</html>
+"""
+
+
+class Upload:
+    def __init__(self, *, library: str, filename: str, data: bytes):
+        self.library = library
+        self.filename = filename
+        self.data = data
+        self.md5 = hashlib.md5(data).hexdigest().upper()
+        self.fields: Dict[str, str] = {
+            "metadata_source": "",
+            "metadata_query": "",
+            "title": filename.rsplit(".", 1)[0],
+            "authors": "",
+            "language": "English",
+            "language_options": "English",
+            "description": "",
+            **{k: "" for k in TEXT_FIELDS[3:] + FILE_FIELDS},
+        }
+        self.saved = False
+
+
+class LibgenStandIn:
+    """Minimal, thread-safe emulation of the fiction/scitech upload endpoints.
+
+    `metadata` maps `(metadata_source, metadata_query)` to the form values
+    returned by a successful "fetch bibliographic data" request, `metadata_delays`
+    to how long the lookup takes. Files saved in a library get an edit page and are
+    rejected if uploaded there again (unless `reject_duplicates=False`, e.g. for
+    benchmarks uploading the same file many times). With `keep_data=False`, uploaded files are not kept
+    in memory (only their MD5).
+    """
+
+    def __init__(
+        self,
+        *,
+        metadata: Dict[Tuple[str, str], Dict[str, str]] = None,
+        metadata_delays: Dict[Tuple[str, str], float] = None,
+        keep_data: bool = True,
+        reject_duplicates: bool = True,
+    ):
+        self.metadata = metadata or {}
+        self.keep_data = keep_data
+        self.reject_duplicates = reject_duplicates
+        self.metadata_delays = metadata_delays or {}
+        self.uploads: Dict[str, Upload] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def handle(
+        self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        path = urlsplit(url).path
+        with self._lock:
+            self.requests.append((method, path))
+
+        parts = [p for p in path.split("/") if p]
+        if not parts or parts[0] not in LIBRARIES:
+            return 404, {}, b"Not found"
+
+        if parts[1:] == ["upload"]:
+            if method == "GET":
+                return self._html(UPLOAD_PAGE.format(path=parts[0], error=""))
+            return self._upload(parts[0], headers, body or b"")
+
+        if len(parts) == 4 and parts[1:3] == ["uploads", "new"]:
+            with self._lock:
+                upload = self.uploads.get(parts[3])
+            if upload is None:
+                return 404, {}, b"Not found"
+            if method == "GET":
+                return self._html(self.render_form(upload))
+            return self._submit(upload, parse_qs((body or b"").decode()))
+
+        if len(parts) == 4 and parts[1:3] == ["uploads", "edit"]:
+            # only files saved in this library have an edit page
+            with self._lock:
+                upload = self.uploads.get(parts[3].upper())
+            if upload is None or not self._saved_in(upload, parts[0]):
+                return 404, {}, b"Not found"
+            return self._html(self.render_form(upload))
+
+        return 404, {}, b"Not found"
+
+    def _upload(self, path: str, headers: Dict[str, str], body: bytes):
+        message = BytesParser().parsebytes(
+            b"Content-Type: " + headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        for part in message.walk():
+            if part.get_param("name", header="content-disposition") == "file":
+                upload = Upload(
+                    library=LIBRARIES[path],
+                    filename=part.get_filename(),
+                    data=part.get_payload(decode=True),
+                )
+                if not self.keep_data:
+                    upload.data = b""
+                break
+        else:
+            return self._html(
+                UPLOAD_PAGE.format(
+                    path=path, error='<div class="form_error">No file uploaded</div>'
+                )
+            )
+
+        with self._lock:
+            existing = self.uploads.get(upload.md5)
+            if (
+                self.reject_duplicates
+                and existing is not None
+                and self._saved_in(existing, path)
+            ):
+                return self._html(
+                    UPLOAD_PAGE.format(
+                        path=path,
+                        error='<div class="form_error">File already in the library</div>',
+                    )
+                )
+            self.uploads.setdefault(upload.md5, upload)
+
+        return 301, {"Location": f"/{path}/uploads/new/{upload.md5}"}, b""
+
+    def _submit(self, upload: Upload, data: Dict[str, List[str]]):
+        # like the real form, render from the posted values rather than server state
+        fields = dict(upload.fields)
+        fields.update({k: v[0] for k, v in data.items() if k in fields})
+
+        if "fetch_metadata" in data:
+            key = (fields["metadata_source"], fields["metadata_query"])
+            if delay := self.metadata_delays.get(key):
+                time.sleep(delay)
+            if fetched := self.metadata.get(key):
+                for k in TEXT_FIELDS + ["description"]:
+                    fields[k] = fetched.get(k, "")
+                fields["language_options"] = fields["language"]
+            return self._html(self.render_form(upload, fields))
+
+        upload.fields = fields
+        if not fields["title"] or not fields["language"]:
+            return self._html(
+                self.render_form(
+                    upload, fields, error="Title and language are required"
+                )
+            )
+
+        upload.saved = True
+        url = (
+            f"https://library.bz/{SITE_PATHS[upload.library]}/uploads/edit/{upload.md5}"
+        )
+        return self._html(SAVED_PAGE.format(url=url))
+
+    @staticmethod
+    def _saved_in(upload: Upload, path: str) -> bool:
+        return upload.saved and upload.library == LIBRARIES[path]
+
+    @staticmethod
+    def render_form(
+        upload: Upload, fields: Dict[str, str] = None, *, error: str = None
+    ) -> str:
+        fields = fields or upload.fields
+
+        def options(values: List[str], selected: str) -> str:
+            return "".join(
+                '<option value="{0}"{1}>{0}</option>'.format(
+                    v, " selected" if v == selected else ""
+                )
+                for v in values
+            )
+
+        inputs = "".join(
+            f'<input type="text" name="{k}" value="{escape(fields[k])}">'
+            for k in TEXT_FIELDS + FILE_FIELDS
+        )
+        return f"""<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN" "http://www.w3.org/TR/html4/strict.dtd">
+<html>
+<body>
+<form method="post" enctype="application/x-www-form-urlencoded" action="" id="record_form">
+<noscript><div class="form_error">You have JavaScript disabled, the functionality of the form can be limited.</div></noscript>
+{f'<div class="error">{escape(error)}</div>' if error else ''}
+<div>Fetch bibliographic data from
+<select name="metadata_source">{options(METADATA_SOURCES, fields["metadata_source"])}</select>
+<input type="text" name="metadata_query" value="{escape(fields["metadata_query"])}">
+<input type="submit" name="fetch_metadata" value="Fetch">
+</div>
+<select name="language_options">{options([""] + LANGUAGES, fields["language_options"])}</select>
+{inputs}
+<textarea name="description">{escape(fields["description"])}</textarea>
+<ul class="checksums"><li><i>MD5</i> <pre>{upload.md5}</pre></li></ul>
+<div><input type="submit" value="SUBMIT!" class="submit"></div>
+</form>
+</body>
+</html>
+"""
+
+    @staticmethod
+    def _html(html: str) -> Tuple[int, Dict[str, str], bytes]:
+        return 200, {"Content-Type": "text/html; charset=UTF-8"}, html.encode()
+
+
+class MockLibgenServer:
+    """
+    Serves a `LibgenStandIn` over HTTP on a background thread.
+
+    `latency` seconds are added to every response, request and response bodies are
+    transferred at most at `bandwidth` bytes per second, and a random `error_rate`
+    fraction of requests fails with `error_status`.
+    """
+
+    def __init__(
+        self,
+        stand_in: LibgenStandIn = None,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        bandwidth: float = None,
+        error_rate: float = 0,
+        error_status: int = 503,
+        seed: int = None,
+    ):
+        self.stand_in = stand_in or LibgenStandIn()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> MockLibgenServer:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> MockLibgenServer:
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _throttle(self, started: float, transferred: int):
+        if self.bandwidth:
+            time.sleep(max(0.0, started + transferred / self.bandwidth - time.time()))
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def log_message(self, format, *args):
+                logging.debug("mock server: " + format, *args)
+
+            def _read_body(self) -> bytes:
+                started, chunks, read = time.time(), [], 0
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    while size := int(self.rfile.readline().split(b";")[0], 16):
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                        read += size
+                        server._throttle(started, read)
+                    self.rfile.readline()
+                else:
+                    remaining = int(self.headers.get("Content-Length") or 0)
+                    while remaining > 0:
+                        chunk = self.rfile.read(min(remaining, 64 * 1024))
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                        read += len(chunk)
+                        remaining -= len(chunk)
+                        server._throttle(started, read)
+                return b"".join(chunks)
+
+            def _handle(self):
+                body = self._read_body()
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if server._inject_error():
+                    status, headers, content = (
+                        server.error_status,
+                        {"Content-Type": "text/plain"},
+                        b"Injected error",
+                    )
+                else:
+                    status, headers, content = server.stand_in.handle(
+                        self.command, self.path, self.headers, body  # type: ignore
+                    )
+
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+
+                started = time.time()
+                for i in range(0, len(content), 64 * 1024):
+                    self.wfile.write(content[i : i + 64 * 1024])
+                    server._throttle(started, i + 64 * 1024)
+
+        return Handler
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the library.bz upload forms."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0, help="seconds")
+    parser.add_argument("--bandwidth", type=float, help="bytes per second")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument(
+        "--allow-duplicates",
+        action="store_true",
+        help="accept files that were already saved",
+    )
+    args = parser.parse_args()
+
+    server = MockLibgenServer(
+        LibgenStandIn(keep_data=False, reject_duplicates=not args.allow_duplicates),
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+    )
+    print(f"Serving on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Header-only file checks, run before any byte is uploaded.
+
+Only the few bytes needed to recognize a format are read (magic numbers, the PDF
+trailer, the ZIP central directory, the MOBI record 0 header), so checking a file
+takes the same time and memory whatever its size.
+"""
+from __future__ import annotations
+
+import io
+import os
+import re
+import struct
+import time
+
+from typing import BinaryIO, NamedTuple, Optional
+from zipfile import BadZipFile, ZipFile
+
+import filetype
+
+from .helpers import LibgenUploadException, calculate_md5
+from .streams import UploadFile, to_reader
+
+HEADER_SIZE = 8192
+# the trailer (or xref stream) holding /Encrypt is at the very end of a PDF
+PDF_TRAILER_SIZE = 64 * 1024
+# encryption.xml entries bigger than this are not just font obfuscation
+MAX_ENCRYPTION_XML_SIZE = 1024 * 1024
+
+EPUB_DRM_FILES = ("META-INF/rights.xml", "META-INF/sinf.xml")
+FONT_OBFUSCATION_ALGORITHMS = (
+    b"http://www.idpf.org/2008/embedding",
+    b"http://ns.adobe.com/pdf/enc#RC",
+)
+
+
+class FileInfo(NamedTuple):
+    extension: Optional[str]
+    size: int
+    drm: bool
+
+
+class PreflightReport(NamedTuple):
+    path: str
+    info: Optional[FileInfo]
+    # only computed when requested (e.g. for the upload ledger)
+    md5: Optional[str]
+    duration: float
+    error: Optional[Exception] = None
+
+
+def _zip_info(reader: BinaryIO) -> Optional[FileInfo]:
+    try:
+        z = ZipFile(reader)  # type: ignore
+    except BadZipFile:
+        return None
+
+    names = set(z.namelist())
+    if "META-INF/container.xml" not in names and "mimetype" not in names:
+        extension = "docx" if "word/document.xml" in names else "zip"
+        return FileInfo(extension, 0, False)
+
+    drm = any(name in names for name in EPUB_DRM_FILES)
+    if not drm and "META-INF/encryption.xml" in names:
+        # an encryption.xml listing only obfuscated fonts is not DRM
+        entry = z.getinfo("META-INF/encryption.xml")
+        algorithms = (
+            re.findall(rb'Algorithm="([^"]+)"', z.read(entry))
+            if entry.file_size <= MAX_ENCRYPTION_XML_SIZE
+            else []
+        )
+        drm = not algorithms or any(
+            a not in FONT_OBFUSCATION_ALGORITHMS for a in algorithms
+        )
+
+    return FileInfo("epub", 0, drm)
+
+
+def _mobi_info(reader: BinaryIO, start: int, header: bytes) -> FileInfo:
+    # PalmDB header, then the record list: the first record holds the PalmDOC and
+    # MOBI headers with the encryption type and the format version (8 for KF8/AZW3)
+    if len(header) < 82:
+        return FileInfo("mobi", 0, False)
+
+    (record0,) = struct.unpack_from(">I", header, 78)
+    reader.seek(start + record0)
+    record = reader.read(40)
+    if len(record) < 14:
+        return FileInfo("mobi", 0, False)
+
+    (encryption,) = struct.unpack_from(">H", record, 12)
+    version = 0
+    if record[16:20] == b"MOBI" and len(record) >= 40:
+        (version,) = struct.unpack_from(">I", record, 36)
+
+    return FileInfo("azw3" if version >= 8 else "mobi", 0, encryption != 0)
+
+
+def _pdf_has_encrypt(reader: BinaryIO, start: int, header: bytes) -> bool:
+    # linearized files repeat the trailer right after the header
+    if b"/Encrypt" in header:
+        return True
+
+    end = reader.seek(0, io.SEEK_END)
+    reader.seek(max(start, end - PDF_TRAILER_SIZE))
+    return b"/Encrypt" in reader.read(PDF_TRAILER_SIZE)
+
+
+def _inspect(reader: BinaryIO, size: int) -> FileInfo:
+    start = reader.tell()
+    header = reader.read(HEADER_SIZE)
+
+    if header.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        reader.seek(start)
+        if info := _zip_info(reader):
+            return info._replace(size=size)
+
+    if b"%PDF-" in header[:1024]:
+        return FileInfo("pdf", size, _pdf_has_encrypt(reader, start, header))
+
+    if header[60:68] in (b"BOOKMOBI", b"TEXtREAd"):
+        return _mobi_info(reader, start, header)._replace(size=size)
+
+    if header.startswith(b"\xeaDRMION\xee"):
+        return FileInfo("kfx", size, True)
+
+    if header.startswith(b"CONT\x02\x00"):
+        return FileInfo("kfx", size, False)
+
+    if header.startswith(b"AT&TFORM") and header[12:16] in (b"DJVU", b"DJVM"):
+        return FileInfo("djvu", size, False)
+
+    if b"<FictionBook" in header:
+        return FileInfo("fb2", size, False)
+
+    kind = filetype.guess(header)
+    return FileInfo(kind.extension if kind else None, size, False)
+
+
+def inspect_file(file: UploadFile) -> FileInfo:
+    """
+    Detects the type of `file` and whether it has DRM, reading only its headers.
+    File objects are inspected from their current position, which is restored.
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            return _inspect(f, os.fstat(f.fileno()).st_size)
+
+    reader = to_reader(file)
+    position = reader.tell()
+    try:
+        return _inspect(reader, len(reader) - position)  # type: ignore
+    finally:
+        reader.seek(position)
+
+
+def preflight(file: UploadFile) -> FileInfo:
+    """Inspects `file`, raising LibgenUploadException if it cannot be uploaded."""
+    info = inspect_file(file)
+
+    if info.size == 0:
+        raise LibgenUploadException("Upload failed: file is empty.")
+
+    if info.drm:
+        if info.extension == "pdf":
+            raise LibgenUploadException("Your .pdf file is encrypted.")
+        raise LibgenUploadException(f"Your .{info.extension} file seems to have DRM.")
+
+    return info
+
+
+def preflight_path(path: str, *, md5: bool = False) -> PreflightReport:
+    """
+    Runs `preflight` (and optionally hashes) the file at `path`, returning failures
+    in the report instead of raising. Meant to run in worker processes.
+    """
+    started = time.perf_counter()
+    try:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Upload failed: {path} is not a file.")
+        info = preflight(path)
+        digest = calculate_md5(path) if md5 else None
+    except Exception as e:
+        return PreflightReport(path, None, None, time.perf_counter() - started, e)
+    return PreflightReport(path, info, digest, time.perf_counter() - started)
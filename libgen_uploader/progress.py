@@ -0,0 +1,88 @@
+"""
+Progress of many uploads at once.
+
+LibgenUploader sends its `observers` a `ProgressEvent` when an upload starts, reaches
+a stage, completes or fails, and while the file is sent (at most every
+`progress_interval` seconds per upload). `ProgressDisplay` shows them as a single
+bar with the total throughput and ETA, `JsonLinesObserver` writes them as JSON lines.
+"""
+from __future__ import annotations
+
+import json
+import sys
+import threading
+
+from typing import Dict, Optional, TextIO, Tuple
+
+from tqdm import tqdm
+
+from .metrics import ProgressEvent, UploadObserver
+
+
+class ProgressDisplay(UploadObserver):
+    """
+    One progress bar for all uploads: bytes sent, throughput, ETA and the count of
+    active, completed and failed uploads. The total grows as uploads start, unless
+    `total_bytes` (e.g. the size of all files to upload) is given.
+    """
+
+    def __init__(self, *, total_bytes: int = None, file: TextIO = None):
+        self._lock = threading.Lock()
+        self._fixed_total = total_bytes is not None
+        # upload_id -> (bytes sent, total bytes)
+        self._sent: Dict[str, Tuple[int, Optional[int]]] = {}
+        self.active = self.completed = self.failed = 0
+        self._bar = tqdm(
+            total=total_bytes or 0,
+            file=file,
+            dynamic_ncols=True,
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+        )
+
+    def progress(self, event: ProgressEvent):
+        with self._lock:
+            if event.kind == "started":
+                self.active += 1
+            elif event.kind in ("completed", "failed"):
+                self.active -= 1
+                if event.kind == "completed":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            elif event.kind != "bytes":
+                return
+
+            sent, total = self._sent.get(event.upload_id, (0, None))
+            if event.kind == "bytes":
+                if total is None and not self._fixed_total:
+                    self._bar.total += event.total_bytes or 0
+                self._sent[event.upload_id] = (event.bytes_sent, event.total_bytes)
+                self._bar.update(event.bytes_sent - sent)
+                return
+
+            self._sent.pop(event.upload_id, None)
+            if event.kind == "failed" and total and not self._fixed_total:
+                # bytes that won't be sent anymore
+                self._bar.total -= total - sent
+            self._bar.set_postfix(
+                active=self.active, done=self.completed, failed=self.failed
+            )
+
+    def close(self):
+        self._bar.close()
+
+
+class JsonLinesObserver(UploadObserver):
+    """Writes every progress event as a JSON object per line (to stdout by default)."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def progress(self, event: ProgressEvent):
+        line = json.dumps(event._asdict(), separators=(",", ":"))
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+
+from dataclasses import dataclass
+from typing import Callable, Tuple, TypeVar
+
+import requests
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retries transient failures (timeouts, connection errors, `statuses` responses)
+    with exponential backoff: the n-th retry waits `backoff * multiplier ** n` seconds
+    (at most `max_backoff`), minus a random `jitter` fraction so that concurrent
+    uploads don't retry in lockstep. `attempts` includes the first one.
+    """
+
+    attempts: int = 3
+    backoff: float = 0.5
+    multiplier: float = 2
+    max_backoff: float = 30
+    jitter: float = 0.5
+    statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def is_transient(self, exception: Exception) -> bool:
+        if isinstance(exception, (requests.ConnectionError, requests.Timeout)):
+            return True
+        if isinstance(exception, requests.HTTPError):
+            response = exception.response
+            return response is not None and response.status_code in self.statuses
+        return False
+
+    def delay(self, retry: int) -> float:
+        delay = min(self.max_backoff, self.backoff * self.multiplier**retry)
+        return delay * (1 - self.jitter * random.random())
+
+    def call(
+        self,
+        function: Callable[..., T],
+        *args,
+        on_retry: Callable[[Exception], None] = None,
+        **kwargs,
+    ) -> T:
+        for attempt in range(self.attempts):
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.attempts or not self.is_transient(e):
+                    raise
+
+                delay = self.delay(attempt)
+                logging.warning(
+                    f"Transient error: {e}. Retrying in {delay:.1f}s ({attempt + 1}/{self.attempts - 1})"
+                )
+                if on_retry:
+                    on_retry(e)
+                time.sleep(delay)
+
+        raise ValueError("RetryPolicy.attempts must be at least 1")
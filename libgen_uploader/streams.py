@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import mmap
+import uuid
+
+from ntpath import basename
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Union
+
+from urllib3.fields import RequestField
+
+# anything that can be uploaded: a path, an in-memory buffer or a binary file object
+UploadFile = Union[str, bytes, bytearray, memoryview, mmap.mmap, BinaryIO]
+
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+# size of the chunks handed to the socket: large enough to keep per-chunk overhead
+# (callbacks, hashing calls, syscalls) negligible
+CHUNK_SIZE = 1024 * 1024
+
+HASH_ALGORITHMS = ("md5", "sha1", "sha256")
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over a buffer (bytes, memoryview, mmap...).
+    Only the chunks being read are copied, never the whole buffer.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos : end].tobytes()
+        self._pos += len(chunk)
+        return chunk
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos : self._pos + len(b)]
+        b[: len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def __len__(self) -> int:
+        # total size: readers of the body subtract the current position themselves
+        return len(self._view)
+
+    def close(self):
+        # lets the owner of the buffer resize or close it (e.g. mmap.close())
+        self._view.release()
+        super().close()
+
+
+class FileReader(io.RawIOBase):
+    """
+    Wraps a seekable binary file object, exposing its size as `len()`. The file is
+    only closed with the reader if `owned` (e.g. opened by this library).
+    """
+
+    def __init__(self, file: BinaryIO, *, owned: bool = False):
+        self._file = file
+        self._owned = owned
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def __len__(self) -> int:
+        position = self._file.tell()
+        size = self._file.seek(0, io.SEEK_END)
+        self._file.seek(position)
+        return size
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+        super().close()
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Wraps a seekable reader, hashing the bytes read from it in the same pass.
+    Bytes read again after seeking back (e.g. a rewound request body) are not hashed twice.
+    """
+
+    def __init__(self, reader: BinaryIO, algorithms: Iterable[str] = HASH_ALGORITHMS):
+        self._reader = reader
+        self._hashed = reader.tell()
+        self._hashes = {name: hashlib.new(name) for name in algorithms}
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._reader.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._reader.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        position = self._reader.tell()
+        chunk = self._reader.read(size)
+        if position <= self._hashed < position + len(chunk):
+            data = memoryview(chunk)[self._hashed - position :]
+            for h in self._hashes.values():
+                h.update(data)
+            self._hashed += len(data)
+        return chunk
+
+    def close(self):
+        self._reader.close()
+        super().close()
+
+    def __len__(self) -> int:
+        position = self._reader.tell()
+        size = self._reader.seek(0, io.SEEK_END)
+        self._reader.seek(position)
+        return size
+
+    def hexdigests(self) -> Dict[str, str]:
+        """Digests of the whole content, first reading whatever was not read yet."""
+        position = self._reader.tell()
+        self._reader.seek(self._hashed)
+        while self.read(1024 * 1024):
+            pass
+        self._reader.seek(position)
+        return {name: h.hexdigest() for name, h in self._hashes.items()}
+
+
+def to_reader(file: UploadFile) -> BinaryIO:
+    """Returns a seekable, sized file object over `file` without copying its content."""
+    if isinstance(file, str):
+        return open(file, "rb")
+
+    if isinstance(file, BUFFER_TYPES):
+        return BufferReader(file)  # type: ignore
+
+    if hasattr(file, "getbuffer"):
+        # BytesIO: share its buffer instead of letting getvalue() copy it
+        reader = BufferReader(file.getbuffer())  # type: ignore
+        reader.seek(file.tell())
+        return reader  # type: ignore
+
+    if not (hasattr(file, "seekable") and file.seekable()):
+        raise ValueError("File objects must be seekable.")
+
+    return FileReader(file)  # type: ignore
+
+
+def open_file(path: str) -> BinaryIO:
+    """
+    Opens `path` for uploading, unbuffered: chunks are read from the page cache in
+    a single copy each. The file is closed with the returned reader.
+    """
+    return FileReader(open(path, "rb", buffering=0), owned=True)  # type: ignore
+
+
+class MultipartBody:
+    """
+    multipart/form-data request body with a single file field, streamed from
+    `reader` in `chunk_size` chunks. Iterable and sized, so requests sends it with a
+    Content-Length and hands each chunk to the socket as is. Each chunk is passed
+    to `callback(body)` (with `body.bytes_read` updated) before being sent.
+
+    Closing the body (or leaving its `with` block) closes the reader.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        file_name: str,
+        reader: BinaryIO,
+        *,
+        chunk_size: int = CHUNK_SIZE,
+        callback: Callable[[MultipartBody], None] = None,
+    ):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+        self.callback = callback
+        self.bytes_read = 0
+        self._reader = reader
+        self._start = reader.tell()
+
+        part = RequestField(name=field, data=b"", filename=file_name)
+        part.make_multipart()
+        self._head = f"--{self.boundary}\r\n{part.render_headers()}".encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.len = len(self._head) + len(reader) - self._start + len(self._tail)  # type: ignore
+
+    def __len__(self) -> int:
+        return self.len
+
+    def _chunks(self) -> Iterator[bytes]:
+        yield self._head
+        while chunk := self._reader.read(self.chunk_size):
+            yield chunk
+        yield self._tail
+
+    def __iter__(self) -> Iterator[bytes]:
+        # restartable, e.g. if the request is sent again
+        self._reader.seek(self._start)
+        self.bytes_read = 0
+        for chunk in self._chunks():
+            self.bytes_read += len(chunk)
+            if self.callback is not None:
+                self.callback(self)
+            yield chunk
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self) -> MultipartBody:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def read_header(reader: BinaryIO, size: int = 8192) -> bytes:
+    """Reads the first bytes of `reader` (from its current position) and rewinds it."""
+    position = reader.tell()
+    header = reader.read(size)
+    reader.seek(position)
+    return header
+
+
+def file_name(file: UploadFile) -> str:
+    if isinstance(file, str):
+        return basename(file)
+
+    name = getattr(file, "name", None)
+    return basename(name) if isinstance(name, str) else ""
@@ -0,0 +1,271 @@
+"""
+Adaptive request scheduling.
+
+A `RequestScheduler` limits the requests sent to each host with a token bucket
+(requests per second) and an AIMD concurrency limit: the limit grows slowly while the
+server answers quickly, and is cut on 429/503 responses, connection errors and slow
+responses. File uploads and everything else (form pages, metadata fetches, saves) are
+scheduled with separate budgets. Share one scheduler between uploaders to schedule
+all of their requests together.
+
+Token buckets also limit the upload bandwidth, counting bytes instead of requests,
+and a `MemoryBudget` limits the memory held by concurrent uploads.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from .streams import BUFFER_TYPES, CHUNK_SIZE, UploadFile
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second, holding at most
+    `burst` tokens. Requests for more tokens than available wait for the deficit.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be positive, got {rate}.")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # reserve now and wait for the debt to be refilled, so waiters are served in order
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+def bandwidth_bucket(rate: Optional[float]) -> Optional[TokenBucket]:
+    """
+    Token bucket of `rate` bytes per second, allowing bursts of 100ms. None (unlimited)
+    for a `rate` of None, ValueError if it isn't positive.
+    """
+    return TokenBucket(rate, rate / 10) if rate is not None else None
+
+
+@dataclass(frozen=True)
+class Budget:
+    # requests per second (None = unlimited) and burst size
+    rate: Optional[float] = None
+    burst: float = 1
+    # AIMD concurrency limit
+    concurrency: int = 4
+    min_concurrency: int = 1
+    max_concurrency: int = 32
+    increase: float = 1
+    decrease: float = 0.5
+    # responses slower than this (seconds) count as congestion
+    slow_threshold: Optional[float] = None
+    # don't cut the limit again for the same burst of failures
+    cooldown: float = 1
+
+
+class _Limiter:
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self.limit = float(budget.concurrency)
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._bucket = TokenBucket(budget.rate, budget.burst) if budget.rate else None
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+        if (pause := self._paused_until - time.monotonic()) > 0:
+            time.sleep(pause)
+        if self._bucket is not None:
+            self._bucket.acquire()
+
+    def release(self, *, congested: bool, retry_after: float = None):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+            b = self.budget
+            if congested:
+                if now - self._last_decrease >= b.cooldown:
+                    self.limit = max(b.min_concurrency, self.limit * b.decrease)
+                    self._last_decrease = now
+            else:
+                # about +increase per round of `limit` successful requests
+                self.limit = min(
+                    b.max_concurrency, self.limit + b.increase / self.limit
+                )
+
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """Per-host, per-budget ("upload" and "metadata") request limits."""
+
+    CONGESTION_STATUSES = (429, 503)
+
+    def __init__(self, *, upload: Budget = None, metadata: Budget = None):
+        self.budgets = {
+            "upload": upload or Budget(concurrency=2),
+            "metadata": metadata or Budget(),
+        }
+        self._limiters: Dict[Tuple[str, str], _Limiter] = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, host: str, budget: str) -> _Limiter:
+        with self._lock:
+            if (key := (host, budget)) not in self._limiters:
+                self._limiters[key] = _Limiter(self.budgets[budget])
+            return self._limiters[key]
+
+    def limits(self) -> Dict[Tuple[str, str], float]:
+        """Current concurrency limit of every (host, budget)."""
+        with self._lock:
+            return {key: limiter.limit for key, limiter in self._limiters.items()}
+
+    def send(self, host: str, budget: str, send):
+        """Calls `send()` once the budget allows, adapting the limits to the outcome."""
+        limiter = self._limiter(host, budget)
+        limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout):
+            limiter.release(congested=True)
+            raise
+        except BaseException:
+            limiter.release(congested=False)
+            raise
+
+        retry_after = None
+        if response.status_code in self.CONGESTION_STATUSES:
+            try:
+                retry_after = float(response.headers.get("Retry-After") or 0)
+            except ValueError:
+                pass
+
+        slow = limiter.budget.slow_threshold
+        limiter.release(
+            congested=response.status_code in self.CONGESTION_STATUSES
+            or (slow is not None and time.monotonic() - started > slow),
+            retry_after=retry_after,
+        )
+        return response
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """HTTPAdapter sending every request through a RequestScheduler."""
+
+    def __init__(self, scheduler: RequestScheduler, **kwargs):
+        self.scheduler = scheduler
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        is_upload = request.method == "POST" and request.headers.get(
+            "Content-Type", ""
+        ).startswith("multipart/form-data")
+        return self.scheduler.send(
+            urlsplit(request.url).netloc,
+            "upload" if is_upload else "metadata",
+            lambda: super(ThrottledAdapter, self).send(request, **kwargs),
+        )
+
+
+# held by every upload besides its file: form pages, request and connection buffers
+UPLOAD_OVERHEAD = 512 * 1024
+
+
+def upload_cost(file: UploadFile, *, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Estimated memory held by an upload of `file`. Files (and file objects) are
+    streamed, so only the chunk read from them and its copy being sent count, while
+    in-memory files count with their whole size. Checking a file only reads its headers.
+    """
+    if isinstance(file, str):
+        size = os.path.getsize(file) if os.path.isfile(file) else 0
+        return UPLOAD_OVERHEAD + min(size, 2 * chunk_size)
+
+    if isinstance(file, BUFFER_TYPES) or hasattr(file, "getbuffer"):
+        buffer = file.getbuffer() if hasattr(file, "getbuffer") else file  # BytesIO
+        size = memoryview(buffer).nbytes  # type: ignore
+        # the whole file and the chunk copied from it
+        return UPLOAD_OVERHEAD + size + min(size, chunk_size)
+
+    return UPLOAD_OVERHEAD + 2 * chunk_size
+
+
+class MemoryBudget:
+    """
+    Bytes of memory that concurrent uploads may hold at once, as estimated by `cost`.
+    Share one budget between batches to limit all of them together.
+
+    The smallest waiting uploads that fit are started first, so small files keep
+    flowing while large ones are in flight. An upload passed over `patience` times
+    is started next, as soon as it fits, so large files aren't starved. An upload
+    larger than the whole budget runs alone.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        *,
+        patience: int = 8,
+        cost: Callable[[UploadFile], int] = upload_cost,
+    ):
+        self.limit = limit
+        self.patience = patience
+        self.cost = cost
+        self.in_flight = 0
+        self._passed_over = 0
+        self._lock = threading.Lock()
+
+    def admit(self, costs: Sequence[int], *, force: bool = False) -> Optional[int]:
+        """
+        Index of the waiting upload (`costs` in arrival order) to start now, if any,
+        reserving its cost. With `force`, one is started even if it doesn't fit.
+        """
+        with self._lock:
+            free = self.limit - self.in_flight
+            if self._passed_over >= self.patience:
+                fitting = [0] if costs[0] <= free else []
+            else:
+                fitting = [i for i, cost in enumerate(costs) if cost <= free]
+            if not fitting:
+                if not (force or self.in_flight == 0):
+                    return None
+                fitting = [0]
+
+            i = min(fitting, key=costs.__getitem__)
+            self._passed_over = 0 if i == 0 else self._passed_over + 1
+            self.in_flight += costs[i]
+            return i
+
+    def release(self, cost: int):
+        with self._lock:
+            self.in_flight -= cost
@@ -2,7 +2,23 @@ import pytest
 
 from libgen_uploader import LibgenUploader
 
+from .stand_in import LibgenStandIn, StandInAdapter
+
 
 @pytest.fixture(scope="function")
 def uploader():
     yield LibgenUploader()
+
+
+@pytest.fixture(scope="function")
+def stand_in(monkeypatch):
+    """Routes every session created by LibgenUploader to a local stand-in."""
+    stand_in = LibgenStandIn()
+    init_session = LibgenUploader._init_session
+
+    def _init_session(self):
+        init_session(self)
+        self._session.mount("https://library.bz/", StandInAdapter(stand_in))
+
+    monkeypatch.setattr(LibgenUploader, "_init_session", _init_session)
+    yield stand_in
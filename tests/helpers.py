@@ -1,9 +1,14 @@
+import os
 import sys
 
 from functools import partial
 
 from returns.contrib.pytest.plugin import _DesiredFunctionFound
 
+from .stand_in import LibgenStandIn
+
+files_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "files")
+
 
 class DesiredValueFound(_DesiredFunctionFound):
     def __init__(self, value):
@@ -25,3 +30,26 @@ def get_return_value(function_to_search, my_flow):
         return e.value
     finally:
         sys.settrace(old_tracer)
+
+
+def make_books(n: int):
+    with open(os.path.join(files_path, "minimal.epub"), "rb") as f:
+        data = f.read()
+    # trailing bytes keep the zip readable while giving each book its own MD5
+    return [data + bytes([i]) for i in range(n)]
+
+
+def upload_posts(stand_in: LibgenStandIn) -> int:
+    """Files sent to the stand-in, in any library."""
+    return sum(
+        1 for m, p in stand_in.requests if m == "POST" and p.endswith("/upload/")
+    )
+
+
+def metadata_posts(stand_in: LibgenStandIn) -> int:
+    return sum(1 for m, p in stand_in.requests if m == "POST" and "/uploads/new/" in p)
+
+
+def uploaded_fields(stand_in: LibgenStandIn):
+    (upload,) = stand_in.uploads.values()
+    return upload.fields
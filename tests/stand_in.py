@@ -0,0 +1,56 @@
+"""In-process transports routing requests to the library.bz stand-in."""
+from __future__ import annotations
+
+import requests
+
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from libgen_uploader.mock_server import LibgenStandIn
+
+
+class StandInAdapter(BaseAdapter):
+    """requests transport adapter that routes requests to a `LibgenStandIn`."""
+
+    def __init__(self, stand_in: LibgenStandIn):
+        super().__init__()
+        self.stand_in = stand_in
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if hasattr(body, "read"):
+            body = body.read()
+        elif body is not None and not isinstance(body, (bytes, str)):
+            body = b"".join(body)
+        if isinstance(body, str):
+            body = body.encode()
+
+        status, headers, content = self.stand_in.handle(
+            request.method, request.url, request.headers, body
+        )
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = content
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def httpx_transport(stand_in: LibgenStandIn):
+    """httpx transport that routes requests to a `LibgenStandIn`."""
+    import httpx
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status, headers, content = stand_in.handle(
+            request.method, str(request.url), request.headers, request.content
+        )
+        return httpx.Response(status, headers=headers, content=content)
+
+    return httpx.MockTransport(handler)
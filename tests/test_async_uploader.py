@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from libgen_uploader import LibgenMetadata
+from libgen_uploader.async_uploader import AsyncLibgenUploader
+from libgen_uploader.helpers import LibgenMetadataException
+from returns.pipeline import is_successful
+
+from .helpers import files_path, make_books
+from .stand_in import LibgenStandIn, httpx_transport
+
+
+def make_uploader(stand_in: LibgenStandIn, **kwargs) -> AsyncLibgenUploader:
+    client = httpx.AsyncClient(transport=httpx_transport(stand_in))
+    return AsyncLibgenUploader(client=client, **kwargs)
+
+
+def test_async_upload():
+    stand_in = LibgenStandIn()
+
+    async def run():
+        async with make_uploader(stand_in) as u:
+            return await u.upload_fiction(os.path.join(files_path, "minimal.epub"))
+
+    result = asyncio.run(run())
+    assert is_successful(result)
+    (upload,) = stand_in.uploads.values()
+    assert upload.saved and upload.library == "fiction"
+    assert result.unwrap().endswith(upload.md5)
+    assert result.unwrap().digests["md5"] == upload.md5.lower()
+
+
+def test_async_upload_from_offset():
+    stand_in = LibgenStandIn()
+    with open(os.path.join(files_path, "minimal.epub"), "rb") as f:
+        content = f.read()
+
+    async def run(f):
+        async with make_uploader(stand_in) as u:
+            return await u.upload_fiction(f)
+
+    f = io.BytesIO(b"junk" + content)
+    f.seek(4)
+    result = asyncio.run(run(f))
+    assert is_successful(result)
+    (upload,) = stand_in.uploads.values()
+    assert upload.md5.lower() == hashlib.md5(content).hexdigest()
+    assert result.unwrap().digests["md5"] == upload.md5.lower()
+
+
+def test_async_concurrent_uploads():
+    stand_in = LibgenStandIn()
+    with open(os.path.join(files_path, "minimal.epub"), "rb") as f:
+        data = f.read()
+
+    async def run():
+        async with make_uploader(stand_in) as u:
+            return await asyncio.gather(
+                *(u.upload_scitech(data + bytes([i])) for i in range(4))
+            )
+
+    results = asyncio.run(run())
+    assert all(is_successful(r) for r in results)
+    assert len(stand_in.uploads) == 4
+    assert all(u.filename.startswith("book.") for u in stand_in.uploads.values())
+
+
+def test_async_metadata():
+    stand_in = LibgenStandIn(
+        metadata={
+            ("amazon_it", "8854165069"): {
+                "title": "La Divina Commedia",
+                "authors": "Dante Alighieri",
+                "language": "Italian",
+            }
+        }
+    )
+
+    async def run():
+        async with make_uploader(stand_in, metadata_source="amazon_it") as u:
+            return await u.upload_fiction(
+                os.path.join(files_path, "minimal.epub"),
+                metadata=LibgenMetadata(year=1472),
+                metadata_query=["missing", "8854165069"],
+            )
+
+    assert is_successful(asyncio.run(run()))
+    (upload,) = stand_in.uploads.values()
+    assert upload.fields["title"] == "La Divina Commedia"
+    assert upload.fields["language"] == "Italian"
+    assert upload.fields["year"] == "1472"
+
+
+def test_async_failures():
+    stand_in = LibgenStandIn()
+
+    async def run():
+        async with make_uploader(stand_in) as u:
+            return await asyncio.gather(
+                u.upload_fiction(os.path.join(files_path, "minimal_drm.epub")),
+                u.upload_fiction(
+                    os.path.join(files_path, "minimal.epub"),
+                    metadata_source="amazon_de",
+                    metadata_query="012kd3o2llds",
+                ),
+            )
+
+    drm, no_results = asyncio.run(run())
+    assert "drm" in str(drm.failure()).lower()
+    assert isinstance(no_results.failure(), LibgenMetadataException)
+
+
+def test_async_client_left_to_caller():
+    stand_in = LibgenStandIn()
+
+    async def run(client):
+        async with AsyncLibgenUploader(client=client) as u:
+            result = await u.upload_fiction(os.path.join(files_path, "minimal.epub"))
+        return result, client.is_closed
+
+    client = httpx.AsyncClient(transport=httpx_transport(stand_in))
+    result, closed = asyncio.run(run(client))
+    assert is_successful(result)
+    assert not closed
+    assert not isinstance(client.auth, httpx.BasicAuth)
+
+
+def test_async_interleaved_sessions():
+    stand_in = LibgenStandIn()
+    sessions = iter(range(100))
+    owners = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)  # lets the other upload run in between
+        path = request.url.path
+        if "/uploads/new/" in path:
+            # form pages belong to the session the file was uploaded with
+            if f"session={owners[path]}" not in request.headers.get("Cookie", ""):
+                return httpx.Response(403, content=b"Wrong session")
+        status, headers, content = stand_in.handle(
+            request.method, str(request.url), request.headers, request.content
+        )
+        if status == 301:
+            owners[headers["Location"]] = session = next(sessions)
+            headers = {**headers, "Set-Cookie": f"session={session}; Path=/"}
+        return httpx.Response(status, headers=headers, content=content)
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with AsyncLibgenUploader(client=client) as u:
+            return await asyncio.gather(
+                *(u.upload_fiction(book) for book in make_books(2))
+            )
+
+    results = asyncio.run(run())
+    assert all(is_successful(r) for r in results), results
+    assert all(u.saved for u in stand_in.uploads.values())
@@ -0,0 +1,131 @@
+import os
+
+from itertools import islice
+
+import pytest
+
+from libgen_uploader import LibgenUploader, UploadJob
+from libgen_uploader.batch import BatchJournal, BatchRunner, read_csv_manifest
+from libgen_uploader.constants import UploadStage
+from libgen_uploader.duplicates import EditPageCheck
+from returns.pipeline import is_successful
+
+from .helpers import files_path, make_books
+from .stand_in import LibgenStandIn
+
+
+def make_jobs(n: int):
+    return [UploadJob(book, job_id=str(i)) for i, book in enumerate(make_books(n))]
+
+
+def test_batch_resumes_after_interruption(stand_in: LibgenStandIn, tmp_path):
+    journal_path = str(tmp_path / "journal.sqlite3")
+    jobs = make_jobs(6)
+
+    runner = BatchRunner(LibgenUploader(), BatchJournal(journal_path), max_workers=2)
+    # consumer stops (e.g. the process is killed) after two results
+    first_run = list(islice(runner.run(jobs), 2))
+    assert len(first_run) == 2
+
+    journal = BatchJournal(journal_path)
+    saved = {e.job_id for e in journal.entries() if e.stage == UploadStage.SAVED}
+    assert len(saved) >= 2
+
+    second_run = list(BatchRunner(LibgenUploader(), journal).run(jobs))
+    assert {job.job_id for job, _ in second_run} == {j.job_id for j in jobs} - saved
+    assert all(is_successful(r) for _, r in second_run)
+
+    assert stand_in.requests.count(("POST", "/fiction/upload/")) == 6
+    assert all(e.stage == UploadStage.SAVED for e in journal.entries())
+    assert all(journal.get(job.job_id).url for job, _ in first_run + second_run)
+
+
+def test_batch_records_failures(stand_in: LibgenStandIn, tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.sqlite3"))
+    jobs = [UploadJob(os.path.join(files_path, "minimal_drm.epub"), job_id="drm")]
+
+    list(BatchRunner(LibgenUploader(), journal).run(jobs))
+    entry = journal.get("drm")
+    assert entry.stage == UploadStage.FAILED and "drm" in entry.error.lower()
+
+    runner = BatchRunner(LibgenUploader(), journal, retry_failed=False)
+    assert list(runner.run(jobs)) == []
+
+
+def test_read_csv_manifest(tmp_path):
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(
+        "filename,isbn,is_fiction\ntest.epub,9788800000000,1\ntest2.epub,,0\n"
+    )
+    first, second = read_csv_manifest(str(manifest))
+    assert (first.job_id, first.library, first.metadata_query) == (
+        "0",
+        "fiction",
+        "9788800000000",
+    )
+    assert (second.job_id, second.library, second.metadata_query) == (
+        "1",
+        "scitech",
+        None,
+    )
+
+
+def test_batch_records_duplicates_as_saved(stand_in: LibgenStandIn, tmp_path):
+    (job,) = make_jobs(1)
+    assert is_successful(LibgenUploader().upload_fiction(job.file_path))
+    journal = BatchJournal(str(tmp_path / "journal.sqlite3"))
+    runner = BatchRunner(LibgenUploader(duplicate_check=EditPageCheck()), journal)
+
+    list(runner.run([job]))
+    entry = journal.get(job.job_id)
+    assert entry.stage == UploadStage.SAVED
+    assert entry.url.startswith("https://library.bz/fiction/uploads/edit/")
+    # not retried
+    assert list(runner.run([job])) == []
+
+
+def test_batch_completes_uploaded_files(stand_in: LibgenStandIn, tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "journal.sqlite3")
+    jobs = make_jobs(1)
+
+    def killed(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    # the process dies after the file was sent, before its metadata form is saved
+    with monkeypatch.context() as m:
+        m.setattr(LibgenUploader, "_complete_form", killed)
+        runner = BatchRunner(LibgenUploader(), BatchJournal(journal_path))
+        with pytest.raises(KeyboardInterrupt):
+            list(runner.run(jobs))
+
+    journal = BatchJournal(journal_path)
+    entry = journal.get("0")
+    assert entry.stage == UploadStage.UPLOADED and entry.pending
+    (upload,) = stand_in.uploads.values()
+    assert not upload.saved
+
+    (result,) = BatchRunner(LibgenUploader(), journal).run(jobs)
+    assert is_successful(result[1])
+    assert upload.saved
+    # not uploaded again
+    assert stand_in.requests.count(("POST", "/fiction/upload/")) == 1
+    entry = journal.get("0")
+    assert entry.stage == UploadStage.SAVED and entry.url and entry.pending is None
+
+
+def test_batch_completes_forms_in_place(stand_in: LibgenStandIn, tmp_path, monkeypatch):
+    completed = []
+    complete_upload = LibgenUploader.complete_upload
+
+    def spy(self, pending, **kwargs):
+        completed.append(pending)
+        return complete_upload(self, pending, **kwargs)
+
+    monkeypatch.setattr(LibgenUploader, "complete_upload", spy)
+    journal = BatchJournal(str(tmp_path / "journal.sqlite3"))
+    results = list(BatchRunner(LibgenUploader(), journal).run(make_jobs(3)))
+
+    assert all(is_successful(r) for _, r in results)
+    # the journal gets a checkpoint, the form is completed from the page in memory
+    assert completed == []
+    assert all(e.stage == UploadStage.SAVED for e in journal.entries())
@@ -0,0 +1,65 @@
+import libgen_uploader.cache
+
+from libgen_uploader import LibgenUploader, MetadataCache
+from libgen_uploader.helpers import LibgenMetadataException
+from returns.pipeline import is_successful
+
+from .helpers import make_books, metadata_posts
+from .stand_in import LibgenStandIn
+
+key = ("fiction", "amazon_it", "8854165069")
+
+
+def test_cache_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(libgen_uploader.cache.time, "time", lambda: now[0])
+
+    cache = MetadataCache(maxsize=2, ttl=60, negative_ttl=10)
+    cache.set(key, {"title": "a"})
+    cache.set(("fiction", "amazon_it", "missing"), None)
+    assert cache.get(("fiction", "amazon_it", "missing")) == {}
+    assert cache.get(key) == {"title": "a"}
+
+    cache.set(("scitech", "amazon_it", "8854165069"), {"title": "b"})
+    assert cache.get(("fiction", "amazon_it", "missing")) is None  # least recently used
+    assert cache.get(key) == {"title": "a"}
+
+    now[0] += 61
+    assert cache.get(key) is None
+
+
+def test_cache_on_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    MetadataCache(path=path).set(key, {"title": "a"})
+    assert MetadataCache(path=path).get(key) == {"title": "a"}
+
+
+def test_cached_metadata_skips_fetch(stand_in: LibgenStandIn):
+    stand_in.metadata[("amazon_it", "8854165069")] = {
+        "title": "La Divina Commedia",
+        "authors": "Dante Alighieri",
+        "language": "Italian",
+    }
+    u = LibgenUploader(metadata_source="amazon_it", metadata_cache=MetadataCache())
+    first, second = make_books(2)
+
+    assert is_successful(u.upload_fiction(first, metadata_query="8854165069"))
+    assert metadata_posts(stand_in) == 2  # fetch + save
+
+    assert is_successful(u.upload_fiction(second, metadata_query="8854165069"))
+    assert metadata_posts(stand_in) == 3  # save only
+
+    for upload in stand_in.uploads.values():
+        assert upload.fields["title"] == "La Divina Commedia"
+        assert upload.fields["language"] == "Italian"
+
+
+def test_negative_cache(stand_in: LibgenStandIn):
+    u = LibgenUploader(metadata_source="amazon_it", metadata_cache=MetadataCache())
+    first, second = make_books(2)
+
+    for book in (first, second):
+        result = u.upload_fiction(book, metadata_query="missing")
+        assert isinstance(result.failure(), LibgenMetadataException)
+
+    assert metadata_posts(stand_in) == 1
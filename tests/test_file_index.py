@@ -0,0 +1,166 @@
+import argparse
+import os
+import threading
+
+import pytest
+
+from libgen_uploader.__main__ import scan
+from libgen_uploader.constants import UploadStage
+from libgen_uploader.file_index import FileIndex, scan_paths
+from libgen_uploader.helpers import calculate_md5
+
+from .helpers import files_path, make_books
+from .stand_in import LibgenStandIn
+
+
+def write_books(directory, n: int):
+    paths = []
+    for i, book in enumerate(make_books(n)):
+        subdir = directory / f"shelf{i % 2}"
+        subdir.mkdir(parents=True, exist_ok=True)
+        path = subdir / f"book{i}.epub"
+        path.write_bytes(book)
+        paths.append(str(path))
+    return paths
+
+
+def scan_args(*paths, index, check_duplicates=False):
+    return argparse.Namespace(
+        paths=[str(p) for p in paths],
+        index=str(index),
+        scitech=False,
+        fiction=True,
+        metadata_source=None,
+        workers=2,
+        preflight_workers=1,
+        memory_budget=None,
+        progress="none",
+        check_duplicates=check_duplicates,
+        retry_failed=False,
+    )
+
+
+def test_scan_paths(tmp_path):
+    books = write_books(tmp_path, 4)
+    (tmp_path / "cover.jpg").write_bytes(b"jpg")
+    (tmp_path / "notes.txt").write_bytes(b"txt")
+
+    assert sorted(scan_paths([str(tmp_path)])) == sorted(books)
+    assert sorted(scan_paths([str(tmp_path / "**" / "book[01].epub")])) == books[:2]
+    # explicit files are kept whatever their extension, duplicates are dropped
+    assert list(scan_paths([str(tmp_path / "notes.txt"), books[0], books[0]])) == [
+        str(tmp_path / "notes.txt"),
+        books[0],
+    ]
+    # mistyped paths and patterns matching nothing are errors, empty folders aren't
+    (tmp_path / "empty").mkdir()
+    assert list(scan_paths([str(tmp_path / "empty")])) == []
+    for pattern in ("missing", "*.pdf"):
+        with pytest.raises(FileNotFoundError):
+            scan_paths([str(tmp_path / "empty"), str(tmp_path / pattern)])
+
+
+def test_file_index_pending(tmp_path):
+    books = write_books(tmp_path, 3)
+    index = FileIndex(str(tmp_path / "index.sqlite3"))
+
+    for path, stat in index.pending(books[:2]):
+        index.record(
+            path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            stage=UploadStage.SAVED if path == books[0] else UploadStage.FAILED,
+            md5="0" * 32,
+        )
+
+    assert [p for p, _ in index.pending(books)] == [books[2]]
+    assert [p for p, _ in index.pending(books, retry_failed=True)] == books[1:]
+
+    # modified files are considered again
+    with open(books[0], "ab") as f:
+        f.write(b"more")
+    assert [p for p, _ in index.pending(books)] == [books[0], books[2]]
+    index.close()
+
+
+def test_file_index_touched_file(tmp_path):
+    (book,) = write_books(tmp_path, 1)
+    index = FileIndex(str(tmp_path / "index.sqlite3"))
+    ((_, stat),) = index.pending([book])
+    index.record(
+        book,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        stage=UploadStage.SAVED,
+        md5=calculate_md5(book),
+    )
+    os.utime(book, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    # same content: skipped, and the new mtime is recorded so it isn't hashed again
+    assert list(index.pending([book])) == []
+    assert index.entries()[book].mtime_ns == stat.st_mtime_ns + 10**9
+    index.close()
+
+
+def test_file_index_hashes_touched_files_aside(tmp_path, monkeypatch):
+    touched, new = write_books(tmp_path, 2)
+    index = FileIndex(str(tmp_path / "index.sqlite3"))
+    stat = os.stat(touched)
+    index.record(
+        touched,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns - 10**9,
+        stage=UploadStage.SAVED,
+        md5="changed",
+    )
+    hashing = threading.Event()
+    hashed = threading.Event()
+
+    def calculate_md5(path):
+        hashing.set()
+        hashed.wait(5)
+        return "modified"
+
+    monkeypatch.setattr("libgen_uploader.file_index.calculate_md5", calculate_md5)
+    pending = index.pending([touched, new])
+
+    # the new file doesn't wait for the touched one to be read
+    assert next(pending)[0] == new
+    assert hashing.wait(5)
+    hashed.set()
+    assert [path for path, _ in pending] == [touched]
+    index.close()
+
+
+def test_scan_uploads_only_new_files(stand_in: LibgenStandIn, tmp_path):
+    books = write_books(tmp_path / "drop", 3)
+    with open(os.path.join(files_path, "minimal_drm.epub"), "rb") as f:
+        (tmp_path / "drop" / "drm.epub").write_bytes(f.read())
+    index = tmp_path / "index.sqlite3"
+
+    assert scan(scan_args(tmp_path / "drop", index=index)) == 1
+    assert len(stand_in.uploads) == 3
+
+    entries = FileIndex(str(index)).entries()
+    assert {entries[b].stage for b in books} == {UploadStage.SAVED}
+    assert all(len(entries[b].md5) == 32 for b in books)
+    assert entries[str(tmp_path / "drop" / "drm.epub")].stage == UploadStage.FAILED
+
+    # nothing new: nothing is uploaded, and the failed file isn't retried
+    assert scan(scan_args(tmp_path / "drop", index=index)) == 0
+    assert len(stand_in.uploads) == 3
+
+    (tmp_path / "drop" / "new.epub").write_bytes(make_books(4)[3])
+    assert scan(scan_args(tmp_path / "drop", index=index)) == 0
+    assert len(stand_in.uploads) == 4
+
+    # with a new index, the library is asked and files already there aren't sent again
+    posts = stand_in.requests.count(("POST", "/fiction/upload/"))
+    args = scan_args(
+        tmp_path / "drop", index=tmp_path / "new.sqlite3", check_duplicates=True
+    )
+    assert scan(args) == 1
+    assert stand_in.requests.count(("POST", "/fiction/upload/")) == posts
+    entries = FileIndex(str(tmp_path / "new.sqlite3")).entries()
+    assert entries[books[0]].stage == UploadStage.SAVED
+    assert entries[books[0]].url.startswith("https://library.bz/fiction/uploads/edit/")
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+import requests
+
+from libgen_uploader import LibgenUploader, UploadLedger
+from libgen_uploader.duplicates import EditPageCheck
+from libgen_uploader.helpers import LibgenDuplicateException, calculate_md5
+from returns.pipeline import is_successful
+
+from .helpers import files_path, upload_posts
+from .stand_in import LibgenStandIn
+
+file_path = os.path.join(files_path, "minimal.epub")
+
+
+def test_ledger_skips_uploaded_files(stand_in: LibgenStandIn, tmp_path):
+    ledger_path = str(tmp_path / "ledger.sqlite3")
+    first = LibgenUploader(ledger=UploadLedger(ledger_path)).upload_fiction(file_path)
+    assert is_successful(first) and upload_posts(stand_in) == 1
+
+    # a new ledger instance reads the same file, as a re-run batch would
+    ledger = UploadLedger(ledger_path)
+    assert ledger.get(calculate_md5(file_path), "fiction") == first.unwrap()
+
+    with open(file_path, "rb") as f:
+        second = LibgenUploader(ledger=ledger).upload_fiction(f.read())
+    assert second == first and upload_posts(stand_in) == 1
+
+
+def test_ledger_is_per_library(stand_in: LibgenStandIn, tmp_path):
+    u = LibgenUploader(ledger=UploadLedger(str(tmp_path / "ledger.sqlite3")))
+    assert is_successful(u.upload_fiction(file_path))
+    assert is_successful(u.upload_scitech(file_path))
+    assert stand_in.requests.count(("POST", "/main/upload/")) == 1
+
+
+def test_ledger_ignores_failed_uploads(stand_in: LibgenStandIn, tmp_path):
+    ledger = UploadLedger(str(tmp_path / "ledger.sqlite3"))
+    u = LibgenUploader(ledger=ledger)
+    result = u.upload_fiction(
+        file_path, metadata_source="amazon_de", metadata_query="x"
+    )
+    assert not is_successful(result)
+    assert ledger.get(calculate_md5(file_path), "fiction") is None
+
+
+class CountingCheck(EditPageCheck):
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+
+    def find(self, session, md5, library, base_url):
+        self.lookups.append((md5, library))
+        if md5 == "broken":
+            raise ConnectionError("lookup unavailable")
+        return super().find(session, md5, library, base_url)
+
+
+def test_duplicate_check_skips_transfer(stand_in: LibgenStandIn):
+    # without the check, a duplicate is only rejected once the file has been sent
+    assert is_successful(LibgenUploader().upload_fiction(file_path))
+    result = LibgenUploader().upload_fiction(file_path)
+    assert "already in the library" in str(result.failure())
+    assert upload_posts(stand_in) == 2
+
+    check = CountingCheck()
+    u = LibgenUploader(duplicate_check=check)
+    result = u.upload_fiction(file_path)
+    error = result.failure()
+    assert isinstance(error, LibgenDuplicateException)
+    assert error.url == (
+        "https://library.bz/fiction/uploads/edit/" + calculate_md5(file_path).upper()
+    )
+    assert upload_posts(stand_in) == 2
+    assert check.lookups == [(calculate_md5(file_path), "fiction")]
+
+    # not in scitech yet: uploaded
+    assert is_successful(u.upload_scitech(file_path))
+
+
+def test_failed_duplicate_check_uploads(stand_in: LibgenStandIn, monkeypatch):
+    monkeypatch.setattr(
+        "libgen_uploader.libgen_uploader.calculate_md5", lambda file: "broken"
+    )
+    u = LibgenUploader(duplicate_check=CountingCheck())
+    assert is_successful(u.upload_fiction(file_path))
+    assert upload_posts(stand_in) == 1
+
+
+MD5 = "0" * 32
+
+
+def edit_page(status: int, content: bytes = b""):
+    class Session:
+        def get(self, url, **kwargs):
+            response = requests.Response()
+            response.status_code = status
+            response._content = content
+            return response
+
+    return Session()
+
+
+def checksums(md5: bytes) -> bytes:
+    return b'<ul class="checksums"><li><i>MD5</i> <pre>' + md5 + b"</pre></ul>"
+
+
+def test_edit_page_check_needs_same_md5(caplog):
+    session = edit_page(200, checksums(MD5.upper().encode()))
+    assert EditPageCheck().find(session, MD5, "fiction", "https://x") == (
+        "https://x/fiction/uploads/edit/" + MD5
+    )
+    assert EditPageCheck().find(edit_page(404), MD5, "fiction", "https://x") is None
+    assert not caplog.records
+
+
+@pytest.mark.parametrize(
+    "status,content",
+    [
+        (200, checksums(b"F" * 32)),
+        (200, b"<html><form>Login</form></html>"),
+        (302, b""),
+    ],
+    ids=["other_md5", "other_page", "redirect"],
+)
+def test_edit_page_check_fails_open(caplog, status: int, content: bytes):
+    session = edit_page(status, content)
+    assert EditPageCheck().find(session, MD5, "fiction", "https://x") is None
+    assert "unexpected edit page" in caplog.text.lower()
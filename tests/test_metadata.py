@@ -0,0 +1,136 @@
+import time
+
+import pytest
+
+from cerberus import Validator
+from libgen_uploader import LibgenMetadata, LibgenUploader, MetadataCache, UploadJob
+from libgen_uploader.constants import METADATA_FORM_SCHEMA
+from libgen_uploader.helpers import LibgenMetadataException, validate_metadata
+from returns.pipeline import is_successful
+
+from .helpers import make_books, uploaded_fields
+from .stand_in import LibgenStandIn
+
+DIVINA_COMMEDIA = {
+    "title": "La Divina Commedia",
+    "authors": "Dante Alighieri",
+    "language": "Italian",
+}
+
+
+def test_sequential_multiple_sources(stand_in: LibgenStandIn):
+    stand_in.metadata[("goodreads", "123")] = DIVINA_COMMEDIA
+    u = LibgenUploader(metadata_source=["amazon_it", "goodreads"])
+
+    assert is_successful(u.upload_fiction(make_books(1)[0], metadata_query="123"))
+    assert uploaded_fields(stand_in)["title"] == "La Divina Commedia"
+
+
+def test_invalid_metadata_strategy():
+    with pytest.raises(ValueError):
+        LibgenUploader(metadata_strategy="fastest")
+
+
+def test_race_first_result(stand_in: LibgenStandIn):
+    stand_in.metadata[("amazon_it", "slow")] = {**DIVINA_COMMEDIA, "title": "slow"}
+    stand_in.metadata[("amazon_it", "fast")] = DIVINA_COMMEDIA
+    stand_in.metadata_delays[("amazon_it", "slow")] = 0.5
+    u = LibgenUploader(metadata_source="amazon_it", metadata_strategy="first")
+
+    result = u.upload_fiction(
+        make_books(1)[0], metadata_query=["missing", "slow", "fast"]
+    )
+    assert is_successful(result)
+    assert uploaded_fields(stand_in)["title"] == "La Divina Commedia"
+
+
+def test_race_most_complete(stand_in: LibgenStandIn):
+    stand_in.metadata[("amazon_it", "123")] = DIVINA_COMMEDIA
+    stand_in.metadata[("worldcat", "123")] = {**DIVINA_COMMEDIA, "year": "1472"}
+    u = LibgenUploader(
+        metadata_source=["amazon_it", "worldcat"], metadata_strategy="most_complete"
+    )
+
+    assert is_successful(u.upload_fiction(make_books(1)[0], metadata_query="123"))
+    assert uploaded_fields(stand_in)["year"] == "1472"
+
+
+def test_race_deadline(stand_in: LibgenStandIn):
+    stand_in.metadata[("amazon_it", "123")] = DIVINA_COMMEDIA
+    stand_in.metadata_delays[("amazon_it", "123")] = 1
+    u = LibgenUploader(
+        metadata_source="amazon_it",
+        metadata_strategy="most_complete",
+        metadata_deadline=0.2,
+    )
+
+    start = time.monotonic()
+    result = u.upload_fiction(make_books(1)[0], metadata_query="123")
+    assert isinstance(result.failure(), LibgenMetadataException)
+    assert time.monotonic() - start < 1
+
+
+def test_race_uses_cache(stand_in: LibgenStandIn):
+    stand_in.metadata[("amazon_it", "123")] = DIVINA_COMMEDIA
+    u = LibgenUploader(
+        metadata_source="amazon_it",
+        metadata_strategy="first",
+        metadata_cache=MetadataCache(),
+    )
+
+    for book in make_books(2):
+        assert is_successful(u.upload_fiction(book, metadata_query="123"))
+
+    posts = [p for m, p in stand_in.requests if m == "POST" and "/uploads/new/" in p]
+    # lookup + save for the first book, only save for the second
+    assert len(posts) == 3
+
+
+def test_libgen_metadata():
+    m = LibgenMetadata(title="title", authors=["a", "b"], pages=10)
+    assert m.to_dict() == {"title": "title", "authors": ["a", "b"], "pages": 10}
+    assert m == LibgenMetadata(pages=10, authors=["a", "b"], title="title")
+    assert m.year is None
+    assert not hasattr(m, "__dict__")
+
+    # hashable, so that upload jobs with metadata are too
+    assert hash(m) == hash(LibgenMetadata(pages=10, authors=["a", "b"], title="title"))
+    job = UploadJob(make_books(1)[0], metadata=m)
+    assert {job: 1}[UploadJob(job.file_path, metadata=LibgenMetadata(**m.to_dict()))]
+
+    with pytest.raises(LibgenMetadataException, match="pages"):
+        LibgenMetadata(pages=0)
+
+
+@pytest.mark.parametrize(
+    "metadata",
+    [
+        {"title": "t", "authors": ["a"], "pages": 1, "ISBNs": ["1", "2"]},
+        {"title": 1},
+        {"pages": 0},
+        {"year": "2000"},
+        {"authors": "a"},
+        {"authors": ["a", 1]},
+        {"authors": ("a", "b")},
+        {"unknown": "x"},
+    ],
+)
+def test_validate_metadata_matches_cerberus(metadata):
+    v = Validator(METADATA_FORM_SCHEMA)
+    assert validate_metadata(metadata) == (True if v.validate(metadata) else v.errors)
+
+
+def test_validate_many():
+    rows = [
+        {"title": "t1", "year": 2000},
+        {"title": "t2", "pages": 0},
+        {"title": "t3", "authors": None},
+        {"title": "t4", "isbn": "123"},
+    ]
+    results = LibgenMetadata.validate_many(rows)
+
+    assert [is_successful(r) for r in results] == [True, False, True, False]
+    assert results[0].unwrap() == LibgenMetadata(title="t1", year=2000)
+    assert "Row 1" in str(results[1].failure())
+    assert "pages" in str(results[1].failure())
+    assert "isbn" in str(results[3].failure())
@@ -0,0 +1,68 @@
+import json
+
+from libgen_uploader import LibgenUploader
+from libgen_uploader.metadata_index import MetadataIndex, main, normalize_identifier
+from returns.pipeline import is_successful
+
+from .helpers import make_books, metadata_posts, uploaded_fields
+from .stand_in import LibgenStandIn
+
+DIVINA_COMMEDIA = {
+    "title": "La Divina Commedia",
+    "authors": ["Dante Alighieri"],
+    "language": "Italian",
+    "year": 1472,
+    "ISBNs": ["88-541-6506-9"],
+    "ASINs": ["B00ABCDEFG"],
+}
+
+
+def test_normalize_identifier():
+    assert normalize_identifier("88-541-6506-9") == "9788854165069"
+    assert normalize_identifier("978 88541 65069") == "9788854165069"
+    assert normalize_identifier("0-8044-2957-x") == "9780804429573"
+    assert normalize_identifier("b00abcdefg") == "B00ABCDEFG"
+
+
+def test_metadata_index(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    dump.write_text(
+        "\n".join(
+            json.dumps(r)
+            for r in (
+                DIVINA_COMMEDIA,
+                {"title": "no identifiers"},
+                {"title": "invalid", "pages": "many", "ISBNs": ["1234567890123"]},
+            )
+        )
+    )
+    main([str(tmp_path / "index.sqlite3"), str(dump)])
+    index = MetadataIndex(str(tmp_path / "index.sqlite3"))
+
+    expected = {k: v for k, v in DIVINA_COMMEDIA.items() if k != "ASINs"}
+    assert index.get("9788854165069") == expected
+    assert index.get("8854165069") == expected
+    assert index.get("b00abcdefg") == expected
+    assert index.get("1234567890123") is None
+    index.close()
+
+
+def test_indexed_metadata_skips_fetch(stand_in: LibgenStandIn, tmp_path):
+    index = MetadataIndex(str(tmp_path / "index.sqlite3"))
+    index.add_many([DIVINA_COMMEDIA])
+    stand_in.metadata[("amazon_it", "missing")] = {"title": "Remote title"}
+    u = LibgenUploader(metadata_source="amazon_it", metadata_index=index)
+    first, second = make_books(2)
+
+    assert is_successful(u.upload_fiction(first, metadata_query="8854165069"))
+    assert metadata_posts(stand_in) == 1  # save only
+    fields = uploaded_fields(stand_in)
+    assert fields["title"] == "La Divina Commedia"
+    assert fields["authors"] == "Dante Alighieri"
+    assert fields["language"] == "Italian"
+
+    # index misses fall back to the remote sources
+    stand_in.uploads.clear()
+    assert is_successful(u.upload_fiction(second, metadata_query="missing"))
+    assert metadata_posts(stand_in) == 3  # fetch + save
+    assert uploaded_fields(stand_in)["title"] == "Remote title"
@@ -0,0 +1,140 @@
+import io
+import json
+import os
+import socket
+
+from libgen_uploader import LibgenUploader, UploadJob
+from libgen_uploader.metrics import Metrics, StatsdObserver, UploadObserver
+from libgen_uploader.progress import JsonLinesObserver, ProgressDisplay
+from returns.pipeline import is_successful
+
+from .helpers import files_path, make_books
+from .stand_in import LibgenStandIn
+
+
+class Recorder(UploadObserver):
+    def __init__(self):
+        self.events = []
+
+    def stage_finished(self, event):
+        self.events.append(event)
+
+
+class ProgressRecorder(UploadObserver):
+    def __init__(self):
+        self.events = []
+
+    def progress(self, event):
+        self.events.append(event)
+
+
+def test_stage_events(stand_in: LibgenStandIn):
+    stand_in.metadata[("goodreads", "2")] = {"title": "Found", "language": "English"}
+    recorder = Recorder()
+    u = LibgenUploader(metadata_source="goodreads", observers=[recorder])
+    book = make_books(1)[0]
+
+    assert is_successful(u.upload_fiction(book, metadata_query=["1", "2"]))
+    assert [e.stage for e in recorder.events] == [
+        "validate",
+        "upload",
+        "check_upload",
+        "parse_form",
+        "fetch_metadata",
+        "update_metadata",
+        "validate_metadata",
+        "save",
+        "total",
+    ]
+    events = {e.stage: e for e in recorder.events}
+    assert all(e.ok and e.duration >= 0 for e in recorder.events)
+    assert events["upload"].bytes_sent > len(book)
+    # falling back to the next query is not a retry, only RetryPolicy retries count
+    assert events["fetch_metadata"].retries == 0
+
+
+def test_prometheus_export(stand_in: LibgenStandIn):
+    metrics = Metrics()
+    u = LibgenUploader(observers=[metrics])
+
+    assert is_successful(u.upload_fiction(make_books(1)[0]))
+    assert is_successful(u.upload_fiction(make_books(2)[1]))
+    assert not is_successful(
+        u.upload_scitech(os.path.join(files_path, "minimal_drm.epub"))
+    )
+
+    text = metrics.to_prometheus()
+    assert 'libgen_uploader_stages_total{stage="save",status="ok"} 2' in text
+    assert 'libgen_uploader_stages_total{stage="total",status="failed"} 1' in text
+    assert (
+        'libgen_uploader_stage_failures_total{stage="validate",'
+        'reason="LibgenUploadException"} 1'
+    ) in text
+    assert 'libgen_uploader_stage_duration_seconds_count{stage="upload"} 2' in text
+    assert 'libgen_uploader_bytes_sent_total{library="fiction"}' in text
+
+
+def test_statsd_observer(stand_in: LibgenStandIn):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(5)
+    statsd = StatsdObserver(*server.getsockname(), prefix="test")
+
+    u = LibgenUploader(observers=[statsd])
+    assert is_successful(u.upload_fiction(make_books(1)[0]))
+
+    packets = [server.recv(4096).decode() for _ in range(7)]
+    assert packets[0].startswith("test.validate.duration:")
+    assert any("test.fiction.bytes_sent:" in p for p in packets)
+    statsd.close()
+    server.close()
+
+
+def test_progress_events(stand_in: LibgenStandIn):
+    recorder = ProgressRecorder()
+    u = LibgenUploader(observers=[recorder], progress_interval=0)
+    book = make_books(1)[0]
+    jobs = [
+        UploadJob(book, library="fiction", job_id="good"),
+        UploadJob(os.path.join(files_path, "minimal_drm.epub"), job_id="drm"),
+    ]
+    assert len(list(u.upload_many(jobs, max_workers=2))) == 2
+
+    by_id = {}
+    for event in recorder.events:
+        by_id.setdefault(event.upload_id, []).append(event)
+    good, drm = by_id["good"], by_id["drm"]
+
+    assert [(e.kind, e.stage) for e in good if e.kind != "bytes"] == [
+        ("started", None),
+        ("stage", "validated"),
+        ("stage", "uploaded"),
+        ("completed", None),
+    ]
+    sent = [e.bytes_sent for e in good if e.kind == "bytes"]
+    assert sent == sorted(sent) and sent[-1] == good[-1].bytes_sent > len(book)
+    assert good[-1].url.startswith("https://library.bz/fiction/uploads/edit/")
+
+    assert [e.kind for e in drm] == ["started", "failed"]
+    assert drm[-1].name == "minimal_drm.epub"
+    assert drm[-1].error.startswith("LibgenUploadException: ")
+
+
+def test_progress_display(stand_in: LibgenStandIn):
+    out, lines = io.StringIO(), io.StringIO()
+    display = ProgressDisplay(file=out)
+    # a long interval leaves only the final bytes event of each upload
+    u = LibgenUploader(
+        observers=[display, JsonLinesObserver(lines)], progress_interval=3600
+    )
+    jobs = [UploadJob(book, library="fiction") for book in make_books(3)]
+    assert all(is_successful(r) for _, r in u.upload_many(jobs, max_workers=2))
+    display.close()
+
+    assert (display.active, display.completed, display.failed) == (0, 3, 0)
+    assert display._bar.n == display._bar.total > 0
+    assert "done=3" in out.getvalue()
+
+    events = [json.loads(line) for line in lines.getvalue().splitlines()]
+    assert [e["kind"] for e in events].count("bytes") == 3
+    assert len({e["upload_id"] for e in events}) == 3
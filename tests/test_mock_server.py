@@ -0,0 +1,43 @@
+import time
+
+import requests
+
+from libgen_uploader import LibgenUploader
+from libgen_uploader.mock_server import MockLibgenServer
+from returns.pipeline import is_successful
+
+from .helpers import make_books
+
+
+def test_upload_over_http():
+    with MockLibgenServer() as server:
+        u = LibgenUploader(base_url=server.url, metadata_source="goodreads")
+        server.stand_in.metadata[("goodreads", "123")] = {
+            "title": "Fetched",
+            "language": "English",
+        }
+        result = u.upload_scitech(make_books(1)[0], metadata_query="123")
+
+    assert is_successful(result)
+    (upload,) = server.stand_in.uploads.values()
+    assert upload.saved and upload.library == "scitech"
+    assert upload.fields["title"] == "Fetched"
+
+
+def test_latency_and_bandwidth():
+    with MockLibgenServer(latency=0.05, bandwidth=200_000) as server:
+        started = time.time()
+        assert is_successful(
+            LibgenUploader(base_url=server.url).upload_fiction(make_books(1)[0])
+        )
+
+    # 4 requests (upload page, file, redirect, save) and ~19 KB at 200 KB/s
+    assert time.time() - started >= 4 * 0.05 + 0.09
+
+
+def test_error_injection():
+    with MockLibgenServer(error_rate=1, error_status=502) as server:
+        result = LibgenUploader(base_url=server.url).upload_fiction(make_books(1)[0])
+
+    assert isinstance(result.failure(), requests.HTTPError)
+    assert not server.stand_in.uploads
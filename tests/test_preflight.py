@@ -0,0 +1,99 @@
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+from libgen_uploader import LibgenUploader
+from libgen_uploader.helpers import LibgenUploadException
+from libgen_uploader.preflight import inspect_file, preflight
+
+from .helpers import files_path
+
+
+def make_mobi(*, encryption: int = 0, version: int = 6) -> bytes:
+    header = bytearray(78) + struct.pack(">IxxxxHH", 90, 0, 0)
+    header[60:68] = b"BOOKMOBI"
+    record0 = struct.pack(">HHIHHHH", 1, 0, 1000, 1, 4096, encryption, 0)
+    record0 += (
+        b"MOBI" + struct.pack(">IIII", 232, 2, 65001, 1) + struct.pack(">I", version)
+    )
+    return bytes(header) + record0 + bytes(1024)
+
+
+def make_epub(encryption_xml: bytes = None) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("mimetype", "application/epub+zip")
+        z.writestr("META-INF/container.xml", "<container/>")
+        if encryption_xml is not None:
+            z.writestr("META-INF/encryption.xml", encryption_xml)
+    return buffer.getvalue()
+
+
+FONT_OBFUSCATION = b'<encryption><EncryptionMethod Algorithm="http://www.idpf.org/2008/embedding"/></encryption>'
+ADEPT = b'<encryption><EncryptionMethod Algorithm="http://www.w3.org/2001/04/xmlenc#aes128-cbc"/></encryption>'
+
+
+@pytest.mark.parametrize(
+    "data,extension,drm",
+    [
+        (
+            b"%PDF-1.7\n" + bytes(100_000) + b"trailer\n<</Root 1 0 R>>\n%%EOF",
+            "pdf",
+            False,
+        ),
+        (
+            b"%PDF-1.7\n" + bytes(100_000) + b"trailer\n<</Encrypt 5 0 R>>\n%%EOF",
+            "pdf",
+            True,
+        ),
+        (make_mobi(), "mobi", False),
+        (make_mobi(encryption=2), "mobi", True),
+        (make_mobi(version=8), "azw3", False),
+        (b"\xeaDRMION\xee" + bytes(100), "kfx", True),
+        (b"AT&TFORM\x00\x00\x01\x00DJVMDIRM" + bytes(100), "djvu", False),
+        (make_epub(), "epub", False),
+        (make_epub(FONT_OBFUSCATION), "epub", False),
+        (make_epub(ADEPT), "epub", True),
+    ],
+    ids=lambda v: v if isinstance(v, str) else None,
+)
+def test_inspect_file(data: bytes, extension: str, drm: bool):
+    info = inspect_file(memoryview(data))
+    assert (info.extension, info.size, info.drm) == (extension, len(data), drm)
+
+
+def test_inspect_file_restores_position():
+    with open(os.path.join(files_path, "minimal_drm.epub"), "rb") as f:
+        f.seek(0)
+        assert inspect_file(f).drm
+        assert f.tell() == 0
+
+
+@pytest.mark.parametrize(
+    "data,message",
+    [
+        (b"", "empty"),
+        (b"%PDF-1.4\n" + b"trailer <</Encrypt 2 0 R>>", "encrypted"),
+        (make_mobi(encryption=1), "drm"),
+    ],
+    ids=["empty", "pdf", "mobi"],
+)
+def test_preflight_rejects(data: bytes, message: str):
+    with pytest.raises(LibgenUploadException) as e:
+        preflight(data)
+    assert message in e.value.message.lower()
+
+
+def test_preflight_leaves_file_types_to_the_server():
+    # only DRM and encryption are checked, not what kind of file it is
+    assert preflight(b"\x89PNG\r\n\x1a\n" + bytes(100)).extension == "png"
+
+
+def test_validate_file_rejects_before_upload(tmp_path):
+    path = tmp_path / "book.mobi"
+    path.write_bytes(make_mobi(encryption=2))
+    result = LibgenUploader._validate_file(str(path))
+    assert "drm" in str(result.failure()).lower()
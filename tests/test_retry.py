@@ -0,0 +1,103 @@
+import pytest
+import requests
+
+from libgen_uploader import LibgenUploader
+from libgen_uploader.metrics import UploadObserver
+from libgen_uploader.retry import RetryPolicy
+from returns.pipeline import is_successful
+
+from .helpers import make_books, upload_posts
+from .stand_in import LibgenStandIn
+
+NO_WAIT = RetryPolicy(attempts=3, backoff=0)
+
+
+def fail_requests(stand_in: LibgenStandIn, matches, *, times: int, status=503):
+    """Makes the first `times` requests for which `matches(method, path, body)` fail."""
+    handle = stand_in.handle
+    failures = []
+
+    def failing_handle(method, url, headers, body):
+        if len(failures) < times and matches(method, url, body or b""):
+            failures.append(url)
+            return status, {}, b"Service unavailable"
+        return handle(method, url, headers, body)
+
+    stand_in.handle = failing_handle
+    return failures
+
+
+def is_save(method, url, body):
+    return method == "POST" and "/uploads/new/" in url and b"fetch_metadata" not in body
+
+
+def test_retry_save_without_uploading_again(stand_in: LibgenStandIn):
+    failures = fail_requests(stand_in, is_save, times=2)
+    result = LibgenUploader(retry_policy=NO_WAIT).upload_fiction(make_books(1)[0])
+
+    assert is_successful(result)
+    assert len(failures) == 2 and upload_posts(stand_in) == 1
+    (upload,) = stand_in.uploads.values()
+    assert upload.saved
+
+
+def test_retry_form_page_after_upload(stand_in: LibgenStandIn):
+    failures = fail_requests(
+        stand_in, lambda m, url, _: m == "GET" and "/uploads/new/" in url, times=1
+    )
+    result = LibgenUploader(retry_policy=NO_WAIT).upload_fiction(make_books(1)[0])
+
+    assert is_successful(result)
+    assert len(failures) == 1 and upload_posts(stand_in) == 1
+
+
+def test_retry_metadata_fetch(stand_in: LibgenStandIn):
+    stand_in.metadata[("goodreads", "1")] = {"title": "Found", "language": "English"}
+    failures = fail_requests(
+        stand_in, lambda m, url, body: b"fetch_metadata" in body, times=1
+    )
+    retries = []
+
+    class Observer(UploadObserver):
+        def stage_finished(self, event):
+            retries.append((event.stage, event.retries))
+
+    u = LibgenUploader(
+        metadata_source="goodreads", retry_policy=NO_WAIT, observers=[Observer()]
+    )
+    assert is_successful(u.upload_fiction(make_books(1)[0], metadata_query="1"))
+    assert len(failures) == 1
+    assert ("fetch_metadata", 1) in retries
+    (upload,) = stand_in.uploads.values()
+    assert upload.fields["title"] == "Found"
+
+
+def test_no_retry_by_default(stand_in: LibgenStandIn):
+    fail_requests(stand_in, is_save, times=1)
+    result = LibgenUploader().upload_fiction(make_books(1)[0])
+    assert isinstance(result.failure(), requests.HTTPError)
+
+
+def test_file_upload_never_retried(stand_in: LibgenStandIn):
+    failures = fail_requests(
+        stand_in, lambda m, url, _: m == "POST" and url.endswith("/upload/"), times=3
+    )
+    result = LibgenUploader(retry_policy=NO_WAIT).upload_fiction(make_books(1)[0])
+
+    assert isinstance(result.failure(), requests.HTTPError)
+    assert len(failures) == 1 and not stand_in.uploads
+
+
+def test_non_transient_errors_not_retried(stand_in: LibgenStandIn):
+    failures = fail_requests(stand_in, is_save, times=3, status=403)
+    result = LibgenUploader(retry_policy=NO_WAIT).upload_fiction(make_books(1)[0])
+
+    assert isinstance(result.failure(), requests.HTTPError)
+    assert len(failures) == 1
+
+
+@pytest.mark.parametrize("retry", range(6))
+def test_backoff(retry: int):
+    policy = RetryPolicy(backoff=1, multiplier=2, max_backoff=10, jitter=0.5)
+    expected = min(10, 2**retry)
+    assert expected / 2 <= policy.delay(retry) <= expected
@@ -0,0 +1,58 @@
+import pytest
+
+from libgen_uploader import LibgenUploader
+from returns.pipeline import is_successful
+
+from .helpers import make_books
+from .stand_in import LibgenStandIn
+
+
+def test_session_reused_across_uploads(stand_in: LibgenStandIn):
+    u = LibgenUploader()
+    session = u._session
+
+    browsers = set()
+    for book in make_books(2):
+        assert is_successful(u.upload_fiction(book))
+        browsers.add(id(u._browser))
+        assert u._browser.session is session
+
+    assert len(browsers) == 2
+
+
+def test_skip_upload_page(stand_in: LibgenStandIn):
+    u = LibgenUploader(preload_upload_page=False)
+    assert is_successful(u.upload_fiction(make_books(1)[0]))
+    assert ("GET", "/fiction/upload/") not in stand_in.requests
+
+
+def test_session_settings():
+    u = LibgenUploader(pool_size=3, keep_alive=False, timeout=(5, 30))
+    assert u._session.adapters["https://"]._pool_maxsize == 3
+    assert u._session.headers["Connection"] == "close"
+    assert u._browser.timeout == (5, 30)
+
+    clone = u._clone()
+    assert clone._session is not u._session
+    assert u._clone(share_session=True)._session is u._session
+
+
+def test_responses_parsed_once(stand_in: LibgenStandIn, monkeypatch):
+    import bs4
+
+    parses = []
+    init = bs4.BeautifulSoup.__init__
+
+    def counting_init(self, markup="", *args, **kwargs):
+        parses.append(markup)
+        init(self, markup, *args, **kwargs)
+
+    monkeypatch.setattr(bs4.BeautifulSoup, "__init__", counting_init)
+    assert is_successful(LibgenUploader().upload_fiction(make_books(1)[0]))
+    # upload form page and saved page
+    assert len(parses) == 2
+
+
+def test_unavailable_parser():
+    with pytest.raises(ValueError):
+        LibgenUploader(parser="not-a-parser")
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import mmap
+import os
+
+import pytest
+import requests
+
+from libgen_uploader import LibgenUploader, streams
+from libgen_uploader.streams import (
+    BufferReader,
+    HashingReader,
+    MultipartBody,
+    to_reader,
+)
+from requests_toolbelt import MultipartEncoder
+from returns.pipeline import is_successful
+
+from .helpers import files_path
+from .stand_in import LibgenStandIn
+
+file_path = os.path.join(files_path, "minimal.epub")
+
+
+def read_book() -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def test_buffer_reader():
+    data = bytearray(b"0123456789")
+    reader = BufferReader(memoryview(data))
+    assert reader.read(4) == b"0123" and len(reader) == 10
+    reader.seek(-2, io.SEEK_END)
+    assert reader.read() == b"89" and reader.tell() == 10
+
+    # no copy: changes to the underlying buffer are visible
+    data[0:1] = b"x"
+    reader.seek(0)
+    assert reader.read(1) == b"x"
+
+
+def test_failed_upload_releases_buffer(stand_in: LibgenStandIn):
+    u = LibgenUploader()
+    assert is_successful(u.upload_fiction(read_book()))
+    with open(file_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # rejected as already in the library, the browser keeps the response
+    assert "already" in str(u.upload_fiction(mm).failure())
+    mm.close()
+
+    data = bytearray(read_book())
+    assert not is_successful(u.upload_fiction(data))
+    data += b"resizable again"
+
+
+def test_non_seekable_file_rejected():
+    class Stream(io.RawIOBase):
+        def readable(self):
+            return True
+
+    with pytest.raises(ValueError):
+        to_reader(Stream())
+
+
+@pytest.mark.parametrize("kind", ["memoryview", "bytearray", "bytesio", "mmap"])
+def test_upload_buffers(stand_in: LibgenStandIn, kind: str):
+    data = read_book()
+    if kind == "memoryview":
+        file = memoryview(data)
+    elif kind == "bytearray":
+        file = bytearray(data)
+    elif kind == "bytesio":
+        file = io.BytesIO(data)
+    else:
+        f = open(file_path, "rb")
+        file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    assert is_successful(LibgenUploader().upload_fiction(file))
+    (upload,) = stand_in.uploads.values()
+    assert upload.data == data and upload.filename.startswith("book.")
+
+
+def test_upload_file_object(stand_in: LibgenStandIn):
+    with open(file_path, "rb") as f:
+        assert is_successful(LibgenUploader().upload_scitech(f))
+
+    (upload,) = stand_in.uploads.values()
+    assert upload.data == read_book() and upload.filename == "minimal.epub"
+
+
+def test_file_object_drm():
+    with open(os.path.join(files_path, "minimal_drm.epub"), "rb") as f:
+        result = LibgenUploader._validate_file(f)
+        assert "drm" in str(result.failure()).lower()
+        assert f.tell() == 0
+
+
+def test_hashing_reader():
+    data = bytes(range(256)) * 10
+    reader = HashingReader(BufferReader(data))
+    reader.read(100)
+    reader.seek(0)  # re-read bytes are hashed once
+    reader.read(200)
+
+    digests = reader.hexdigests()
+    assert reader.tell() == 200
+    assert digests == {
+        "md5": hashlib.md5(data).hexdigest(),
+        "sha1": hashlib.sha1(data).hexdigest(),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def test_upload_digests(stand_in: LibgenStandIn):
+    result = LibgenUploader().upload_fiction(file_path)
+    assert is_successful(result)
+    url = result.unwrap()
+    assert url.digests["md5"] == hashlib.md5(read_book()).hexdigest()
+    assert url.digests["sha256"] == hashlib.sha256(read_book()).hexdigest()
+
+
+def test_unknown_hash_algorithm():
+    with pytest.raises(ValueError):
+        LibgenUploader(hash_algorithms=["md5", "nope"])
+
+
+def test_upload_file_object_from_offset(stand_in: LibgenStandIn):
+    data = b"junk" + read_book()
+    file = io.BytesIO(data)
+    file.seek(4)
+
+    assert is_successful(LibgenUploader().upload_fiction(file))
+    (upload,) = stand_in.uploads.values()
+    assert upload.data == data[4:]
+
+
+def test_multipart_body():
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    calls = []
+    body = MultipartBody(
+        "file", "bóok.pdf", BufferReader(data), callback=lambda b: calls.append(1)
+    )
+    expected = MultipartEncoder(
+        fields={"file": ("bóok.pdf", io.BytesIO(data))}, boundary=body.boundary
+    ).to_string()
+
+    assert b"".join(body) == expected
+    assert len(body) == len(expected) == body.bytes_read
+    # head, 4 chunks, tail
+    assert len(calls) == 6
+    # can be sent again
+    assert b"".join(body) == expected
+
+
+def test_upload_closes_files(stand_in: LibgenStandIn, monkeypatch):
+    readers = []
+
+    def open_file(path):
+        readers.append(streams.open_file(path))
+        return readers[-1]
+
+    monkeypatch.setattr("libgen_uploader.libgen_uploader.open_file", open_file)
+    u = LibgenUploader()
+    assert is_successful(u.upload_fiction(file_path))
+
+    handle = stand_in.handle
+
+    def reset_uploads(method, *args):
+        if method == "POST":
+            raise requests.ConnectionError("Connection reset")
+        return handle(method, *args)
+
+    monkeypatch.setattr(stand_in, "handle", reset_uploads)
+    assert isinstance(u.upload_fiction(file_path).failure(), requests.ConnectionError)
+
+    assert len(readers) == 2
+    assert all(r.closed and r._file.closed for r in readers)
+
+
+def test_upload_closes_files_on_early_errors(stand_in: LibgenStandIn, monkeypatch):
+    readers = []
+
+    def open_file(path):
+        readers.append(streams.open_file(path))
+        return readers[-1]
+
+    def hashing_reader(*_):
+        raise OSError("Read error")
+
+    monkeypatch.setattr("libgen_uploader.libgen_uploader.open_file", open_file)
+    monkeypatch.setattr("libgen_uploader.libgen_uploader.HashingReader", hashing_reader)
+    assert isinstance(LibgenUploader().upload_fiction(file_path).failure(), OSError)
+    assert len(readers) == 1 and readers[0]._file.closed
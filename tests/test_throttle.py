@@ -0,0 +1,188 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from libgen_uploader import LibgenUploader, UploadJob
+from libgen_uploader.mock_server import MockLibgenServer
+from libgen_uploader.streams import CHUNK_SIZE
+from libgen_uploader.throttle import (
+    UPLOAD_OVERHEAD,
+    Budget,
+    MemoryBudget,
+    RequestScheduler,
+    TokenBucket,
+    bandwidth_bucket,
+    upload_cost,
+)
+from returns.pipeline import is_successful
+
+from .helpers import make_books
+
+
+def response(status: int = 200, headers: dict = None) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    return r
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started >= 4 / 50 * 0.9
+
+
+@pytest.mark.parametrize("rate", [0, -1024])
+def test_bandwidth_must_be_positive(rate):
+    with pytest.raises(ValueError):
+        bandwidth_bucket(rate)
+    with pytest.raises(ValueError):
+        LibgenUploader(bandwidth=rate)
+    with pytest.raises(ValueError):
+        LibgenUploader(upload_bandwidth=rate)
+
+
+def test_bandwidth_none_is_unlimited():
+    assert bandwidth_bucket(None) is None
+    assert LibgenUploader(bandwidth=None, upload_bandwidth=None).bandwidth is None
+
+
+def test_aimd():
+    scheduler = RequestScheduler(metadata=Budget(concurrency=8, cooldown=0))
+    key = ("host", "metadata")
+
+    scheduler.send("host", "metadata", lambda: response(503))
+    assert scheduler.limits()[key] == 4
+
+    for _ in range(8):
+        scheduler.send("host", "metadata", lambda: response())
+    assert 5 < scheduler.limits()[key] < 7
+
+    def reset():
+        raise requests.ConnectionError("reset")
+
+    try:
+        scheduler.send("host", "metadata", reset)
+    except requests.ConnectionError:
+        pass
+    assert scheduler.limits()[key] < 4
+
+
+def test_slow_responses_and_separate_budgets():
+    scheduler = RequestScheduler(
+        upload=Budget(concurrency=2), metadata=Budget(slow_threshold=0.01, cooldown=0)
+    )
+
+    def slow():
+        time.sleep(0.02)
+        return response()
+
+    scheduler.send("host", "metadata", slow)
+    scheduler.send("host", "upload", slow)
+    assert scheduler.limits() == {("host", "metadata"): 2, ("host", "upload"): 2.5}
+
+
+def test_retry_after_pauses_host():
+    scheduler = RequestScheduler()
+    scheduler.send("host", "metadata", lambda: response(429, {"Retry-After": "0.2"}))
+
+    started = time.monotonic()
+    scheduler.send("host", "metadata", lambda: response())
+    assert time.monotonic() - started >= 0.15
+
+
+def test_concurrency_limit():
+    scheduler = RequestScheduler(upload=Budget(concurrency=2, max_concurrency=2))
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def send():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        return response()
+
+    threads = [
+        threading.Thread(target=scheduler.send, args=("host", "upload", send))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak[0] == 2
+
+
+def test_uploader_requests_scheduled():
+    scheduler = RequestScheduler()
+    with MockLibgenServer() as server:
+        u = LibgenUploader(base_url=server.url, scheduler=scheduler)
+        results = [r for _, r in u.upload_many(map(UploadJob, make_books(3)))]
+        host = server.url.split("//")[1]
+
+    assert all(is_successful(r) for r in results)
+    assert set(scheduler.limits()) == {(host, "upload"), (host, "metadata")}
+
+
+def big_books(n: int, size: int):
+    return [b"%PDF-1.4\n" + bytes([i]) * size for i in range(n)]
+
+
+def test_global_bandwidth(stand_in):
+    # 2 x 200K shared at 1M/s: ~0.4s, minus the 100ms burst
+    u = LibgenUploader(bandwidth=1024**2)
+    started = time.monotonic()
+    results = list(
+        u.upload_many(map(UploadJob, big_books(2, 200 * 1024)), max_workers=2)
+    )
+    assert all(is_successful(r) for _, r in results)
+    assert time.monotonic() - started >= 0.25
+
+
+def test_upload_bandwidth(stand_in):
+    # 400K at 1M/s per upload: at least ~0.3s each
+    u = LibgenUploader(upload_bandwidth=1024**2)
+    started = time.monotonic()
+    results = list(
+        u.upload_many(map(UploadJob, big_books(2, 400 * 1024)), max_workers=2)
+    )
+    assert all(is_successful(r) for _, r in results)
+    assert time.monotonic() - started >= 0.25
+
+
+def test_upload_cost(tmp_path):
+    big = tmp_path / "big.pdf"
+    big.write_bytes(b"\0" * (3 * CHUNK_SIZE))
+    # streamed from disk: a chunk and its copy, whatever the file size
+    assert upload_cost(str(big)) == UPLOAD_OVERHEAD + 2 * CHUNK_SIZE
+    # in memory: the whole file
+    assert upload_cost(big.read_bytes()) == UPLOAD_OVERHEAD + 4 * CHUNK_SIZE
+    assert upload_cost(b"1234") == UPLOAD_OVERHEAD + 8
+
+
+def test_memory_budget():
+    budget = MemoryBudget(100, patience=2)
+
+    # smallest first, passing over the oldest upload
+    assert budget.admit([80, 10, 30]) == 1
+    assert budget.admit([80, 30]) == 1
+    # passed over twice: nothing else starts until it fits
+    assert budget.admit([80, 5]) is None
+    assert budget.admit([80, 5], force=True) == 0
+    budget.release(10)
+    budget.release(30)
+    assert budget.admit([5]) == 0
+    assert budget.in_flight == 85
+
+    budget.release(80)
+    budget.release(5)
+    # too large for the budget: runs alone
+    assert budget.admit([500]) == 0
+    assert budget.admit([1]) is None
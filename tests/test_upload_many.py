@@ -0,0 +1,182 @@
+import os
+
+import pytest
+
+from libgen_uploader import (
+    LibgenMetadata,
+    LibgenUploader,
+    PendingUpload,
+    UploadJob,
+    UploadLedger,
+)
+from libgen_uploader.constants import UploadStage
+from libgen_uploader.helpers import calculate_md5
+from libgen_uploader.metrics import Metrics
+from libgen_uploader.throttle import MemoryBudget
+from returns.pipeline import is_successful
+
+from .helpers import files_path, make_books
+from .stand_in import LibgenStandIn
+
+
+def test_upload_many(stand_in: LibgenStandIn):
+    jobs = [
+        UploadJob(book, library="fiction" if i % 2 else "scitech")
+        for i, book in enumerate(make_books(5))
+    ]
+    results = dict(LibgenUploader().upload_many(jobs, max_workers=3))
+
+    assert set(results) == set(jobs)
+    assert all(is_successful(r) for r in results.values())
+    assert len(stand_in.uploads) == 5
+    assert all(u.saved for u in stand_in.uploads.values())
+    assert {u.library for u in stand_in.uploads.values()} == {"fiction", "scitech"}
+
+
+def test_upload_many_failures_are_isolated(stand_in: LibgenStandIn):
+    jobs = [
+        UploadJob(make_books(1)[0]),
+        UploadJob(os.path.join(files_path, "missing.epub")),
+        UploadJob(os.path.join(files_path, "minimal_drm.epub")),
+    ]
+    results = dict(LibgenUploader().upload_many(jobs, max_workers=2))
+
+    assert is_successful(results[jobs[0]])
+    assert isinstance(results[jobs[1]].failure(), FileNotFoundError)
+    assert "drm" in str(results[jobs[2]].failure()).lower()
+
+
+def test_upload_many_uses_one_uploader_per_worker(stand_in: LibgenStandIn, monkeypatch):
+    uploader = LibgenUploader()
+    workers = set()
+    upload_job = LibgenUploader._upload_job
+
+    def _upload_job(self, job, *args, **kwargs):
+        workers.add(self)
+        return upload_job(self, job, *args, **kwargs)
+
+    monkeypatch.setattr(LibgenUploader, "_upload_job", _upload_job)
+    results = list(
+        uploader.upload_many([UploadJob(book) for book in make_books(6)], max_workers=2)
+    )
+
+    assert len(results) == 6
+    assert 1 <= len(workers) <= 2
+    assert uploader not in workers
+    assert len({id(w._browser) for w in workers}) == len(workers)
+
+
+def test_upload_many_preflight_workers(stand_in: LibgenStandIn, tmp_path, monkeypatch):
+    paths = []
+    for i, book in enumerate(make_books(4)):
+        paths.append(str(tmp_path / f"book{i}.epub"))
+        (tmp_path / f"book{i}.epub").write_bytes(book)
+    jobs = [UploadJob(path) for path in paths] + [
+        UploadJob(make_books(5)[4]),
+        UploadJob(os.path.join(files_path, "missing.epub")),
+        UploadJob(os.path.join(files_path, "minimal_drm.epub")),
+    ]
+    metrics = Metrics()
+    uploader = LibgenUploader(
+        ledger=UploadLedger(str(tmp_path / "ledger.sqlite3")), observers=[metrics]
+    )
+    # files checked in a worker process are not hashed again before the upload
+    monkeypatch.setattr(
+        "libgen_uploader.libgen_uploader.calculate_md5",
+        lambda file: pytest.fail("hashed in the upload thread")
+        if isinstance(file, str)
+        else calculate_md5(file),
+    )
+
+    results = dict(uploader.upload_many(jobs, max_workers=2, preflight_workers=2))
+
+    assert all(is_successful(results[job]) for job in jobs[:5])
+    assert isinstance(results[jobs[5]].failure(), FileNotFoundError)
+    assert "drm" in str(results[jobs[6]].failure()).lower()
+    assert len(stand_in.uploads) == 5
+    assert metrics.stages[("validate", "ok")] == 5
+    assert metrics.stages[("validate", "failed")] == 2
+    assert metrics.stages[("total", "ok")] == 5
+
+
+def test_upload_many_memory_budget(stand_in: LibgenStandIn):
+    big, *small = make_books(4)
+    big += b"\0" * 1000
+    jobs = [UploadJob(book) for book in [big] + small]
+    budget = MemoryBudget(len(big) + 100, cost=len)
+    started, peak = [], []
+
+    def on_stage(job: UploadJob, stage: UploadStage):
+        if stage == UploadStage.VALIDATED:
+            started.append(job)
+            peak.append(budget.in_flight)
+
+    results = dict(
+        LibgenUploader().upload_many(
+            jobs, max_workers=4, memory_budget=budget, on_stage=on_stage
+        )
+    )
+
+    assert all(is_successful(r) for r in results.values())
+    # the small files go first, the large one once they're done
+    assert started[-1] == jobs[0]
+    assert max(peak) <= budget.limit
+    assert budget.in_flight == 0
+
+
+def test_two_phase_upload(stand_in: LibgenStandIn):
+    stand_in.metadata[("goodreads", "1")] = {"title": "Fetched", "language": "German"}
+    book = make_books(1)[0]
+    pending = LibgenUploader().begin_upload(
+        book,
+        metadata=LibgenMetadata(year=1999),
+        metadata_source="goodreads",
+        metadata_query="1",
+    )
+    assert is_successful(pending)
+    (upload,) = stand_in.uploads.values()
+    assert not upload.saved
+
+    # completed by another uploader, from the serialized state
+    pending = PendingUpload.from_json(pending.unwrap().to_json())
+    result = LibgenUploader().complete_upload(pending)
+
+    assert result.unwrap() == f"https://library.bz/fiction/uploads/edit/{upload.md5}"
+    assert result.unwrap().digests["md5"] == upload.md5.lower()
+    assert upload.saved
+    assert upload.fields["title"] == "Fetched"
+    assert upload.fields["year"] == "1999"
+    assert stand_in.requests.count(("POST", "/fiction/upload/")) == 1
+
+
+def test_upload_many_metadata_workers(stand_in: LibgenStandIn):
+    stand_in.metadata[("goodreads", "slow")] = {"title": "Slow", "language": "English"}
+    stand_in.metadata_delays[("goodreads", "slow")] = 0.3
+    jobs = [
+        UploadJob(book, metadata_source="goodreads", metadata_query="slow")
+        for book in make_books(4)
+    ]
+    events = []
+    handle = stand_in.handle
+
+    def recording_handle(method, url, headers, body):
+        response = handle(method, url, headers, body)
+        if b"fetch_metadata" in (body or b""):
+            events.append("looked_up")
+        return response
+
+    def on_stage(job: UploadJob, stage: UploadStage):
+        if stage == UploadStage.UPLOADED:
+            events.append("uploaded")
+
+    stand_in.handle = recording_handle
+    results = dict(
+        LibgenUploader().upload_many(
+            jobs, max_workers=1, metadata_workers=4, on_stage=on_stage
+        )
+    )
+
+    assert all(is_successful(r) for r in results.values())
+    assert all(u.saved for u in stand_in.uploads.values())
+    # the single upload worker doesn't wait for the metadata lookups
+    assert events == ["uploaded"] * 4 + ["looked_up"] * 4